@@ -1,13 +1,222 @@
 from __future__ import annotations
 
+import collections
+import concurrent.futures
+import contextlib
+import heapq
 import itertools
+import json
 import multiprocessing as mp
 import os
+import queue
+import shutil
+import socket
 import subprocess
-from os.path import exists
-from typing import List
+import sys
+import time
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+import numpy as np
+import pandas as pd
 import tqdm
 
+from g4bl_suite.DataAnalyzer import DataAnalyzer
+from g4bl_suite.Manifest import RunManifest
+from g4bl_suite.Scheduler import (
+    desired_ranks,
+    estimate_costs,
+    launch_ranks,
+    longest_first,
+    projected_makespan,
+)
+from g4bl_suite.Search import format_value, latin_hypercube, shrink_bounds
+
+
+# Default number of tasks automate() submits to the pool ahead of the ones running, per process
+TASKS_AHEAD_PER_PROCESS = 4
+
+# Number of lines at the end of stderr that run_command() keeps
+STDERR_TAIL_LINES = 20
+
+# Parameters that automate(event_splits=...) passes to give each sub-job its range of events,
+# the beam command of the script has to use them: firstEvent=$first lastEvent=$last
+FIRST_EVENT_PARAM = "first"
+LAST_EVENT_PARAM = "last"
+
+
+# Tasks run in directories named like this inside the output directory, see automate()
+WORK_DIRECTORY_PREFIX = ".g4bl-work-"
+
+# The RunManifest that automate() keeps in the output directory to resume a scan
+JOURNAL_FILE = ".g4bl_manifest.sqlite"
+
+# The directories of the sub-jobs of a split task are renamed like this when they hold files other than
+# the detector files, which can not be concatenated
+KEPT_DIRECTORY_PREFIX = "g4bl-parts-"
+
+
+def split_event_ranges(events: int, parts: int) -> List[tuple]:
+    """
+    Splits the events 1 to `events` into at most `parts` disjoint ranges of nearly the same size
+
+    Returns:
+        A list of (first event, last event) tuples, both ends included
+
+    Examples:
+    >>> split_event_ranges(10, 3)
+    [(1, 3), (4, 6), (7, 10)]
+    >>> split_event_ranges(2, 4)
+    [(1, 1), (2, 2)]
+    """
+    bounds = [events * k // parts for k in range(parts + 1)]
+    return [(bounds[k] + 1, bounds[k + 1]) for k in range(parts) if bounds[k + 1] > bounds[k]]
+
+
+def concatenate_detector_files(part_files: List[str], output_file: str):
+    """
+    Concatenates ASCII detector files of disjoint event ranges into output_file,
+    keeping the # header of the first one only. The output is written to a temporary file then renamed,
+    so output_file is never seen half written.
+    """
+    with open(output_file + ".tmp", "w+b") as out:
+        for i, part_file in enumerate(part_files):
+            with open(part_file, "rb") as f:
+                line = f.readline()
+                while line.startswith(b"#"):
+                    if i == 0:
+                        out.write(line)
+                    line = f.readline()
+                out.write(line)
+                shutil.copyfileobj(f, out, 1 << 20)
+            # the next part must start on its own line
+            if out.tell() > 0:
+                out.seek(-1, os.SEEK_END)
+                if out.read(1) != b"\n":
+                    out.write(b"\n")
+    os.replace(output_file + ".tmp", output_file)
+
+
+def imap_unordered_bounded(pool, func, iterable: Iterable, window: int) -> Iterator:
+    """Same as pool.imap_unordered(func, iterable), with at most `window` tasks submitted and not yet returned
+
+    Pool.imap_unordered() drains the whole iterable into its task queue right away,
+    which defeats a lazy generator of tasks; this only pulls a new task when a result comes back.
+    """
+    results: queue.SimpleQueue[Tuple[bool, Any]] = queue.SimpleQueue()
+    pending = 0
+
+    def next_result():
+        succeeded, value = results.get()
+        if not succeeded:
+            raise value
+        return value
+
+    for item in iterable:
+        if pending >= window:
+            yield next_result()
+            pending -= 1
+        pool.apply_async(
+            func,
+            (item,),
+            callback=lambda value: results.put((True, value)),
+            error_callback=lambda error: results.put((False, error)),
+        )
+        pending += 1
+
+    while pending > 0:
+        yield next_result()
+        pending -= 1
+
+
+class TaskResult(NamedTuple):
+    """
+    What run_command() returns for one task
+    """
+
+    args: List[str]
+    returncode: int
+    wall_time: float
+    cpu_time: float = 0.0
+    max_rss_kb: float = 0.0
+    stderr_tail: str = ""
+
+    @staticmethod
+    def combine(args: List[str], results: List[TaskResult]) -> TaskResult:
+        """
+        Combines the results of the sub-jobs of one task: times add up, the memory is the largest,
+        and the exit code and stderr are the ones of the first sub-job that failed
+        """
+        failed = [result for result in results if result.returncode != 0]
+        return TaskResult(
+            args,
+            failed[0].returncode if failed else 0,
+            sum(result.wall_time for result in results),
+            sum(result.cpu_time for result in results),
+            max(result.max_rss_kb for result in results),
+            failed[0].stderr_tail if failed else "",
+        )
+
+
+class RunReport:
+    """Accumulates the TaskResults of automate(), optionally appending each of them to a JSON-lines log
+
+    Only running totals, the last failures and the slowest tasks are kept, so a report costs the same
+    whatever the number of tasks. Use RunReport.load() to get the whole log back as a DataFrame.
+    """
+
+    SLOWEST_COUNT = 3
+    FAILURES_COUNT = 10
+
+    def __init__(self, log_file: Optional[str] = None):
+        self.log_file = log_file
+        self.count = 0
+        self.failed = 0
+        self.failures: Deque[TaskResult] = collections.deque(maxlen=self.FAILURES_COUNT)
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.max_rss_kb = 0.0
+        self.slowest: List[Tuple[float, int, List[str]]] = []
+
+    def add(self, result: TaskResult):
+        self.count += 1
+        self.wall_time += result.wall_time
+        self.cpu_time += result.cpu_time
+        self.max_rss_kb = max(self.max_rss_kb, result.max_rss_kb)
+        if result.returncode != 0:
+            self.failed += 1
+            self.failures.append(result)
+        heapq.heappush(self.slowest, (result.wall_time, self.count, result.args))
+        if len(self.slowest) > self.SLOWEST_COUNT:
+            heapq.heappop(self.slowest)
+
+        if self.log_file is not None:
+            with open(self.log_file, "a") as f:
+                record = result._asdict()
+                record["finished"] = time.time()
+                f.write(json.dumps(record) + "\n")
+
+    def __str__(self) -> str:
+        if self.count == 0:
+            return "No task was run"
+        lines = [
+            f"Tasks run = {self.count}, failed = {self.failed}",
+            f"Wall time total = {self.wall_time:.1f} s, mean = {self.wall_time / self.count:.1f} s, "
+            f"CPU time total = {self.cpu_time:.1f} s, max RSS = {self.max_rss_kb / 1024:.1f} MiB",
+        ]
+        for wall_time, _, args in sorted(self.slowest, reverse=True):
+            lines.append(f"Slow: {wall_time:.1f} s {' '.join(RunManifest.task_params(args))}")
+        if self.failed > len(self.failures):
+            lines.append(f"Last {len(self.failures)} of the {self.failed} failed tasks:")
+        for result in self.failures:
+            lines.append(f"Failed with exit code {result.returncode}: {' '.join(RunManifest.task_params(result.args))}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def load(log_file: str) -> pd.DataFrame:
+        """
+        Reads a JSON-lines log written by a RunReport, one row per task
+        """
+        return pd.read_json(log_file, lines=True)
+
 
 class Automator:
     def __init__(self):
@@ -48,18 +257,20 @@ class Automator:
         """
         return self.cmd.endswith("g4blmpi")
 
-    def generate_args(self, mpi_count=None) -> List[List[str]]:
+    def iter_param_args(self, params_dict: Optional[dict] = None) -> Iterator[List[str]]:
         """
-        Generates a list of arguments that is the first parameter for subprocess.run
+        Lazily generates the 'key=value' part of the arguments of every combination of the parameter dictionary.
+        Combinations are produced one at a time, so the memory used does not depend on the size of the grid.
 
-
-        Returns:
-            List A of list B of strings, where each list B is 1 config to pass to the command line via subprocess.run
+        Yields:
+            Lists of 'key=value' strings, 1 list per config
         """
+        if params_dict is None:
+            params_dict = self.params_dict
 
-        keys = []
+        keys: List[str] = []
         values = []
-        for key, value in self.params_dict.items():
+        for key, value in params_dict.items():
             # Handle keys: Extend with elements if key is a tuple
             # or add the key itself in form of a list if it's not a tuple
             keys.extend(key if isinstance(key, tuple) else [key])
@@ -67,10 +278,6 @@ class Automator:
             # Handle values: Append the value converted into a list if it's a tuple, otherwise append the value itself
             values.append(list(value) if isinstance(value, tuple) else value)
 
-        # combinations = list(itertools.product(*param_dict.values()))
-
-        combinations = list(itertools.product(*values))
-
         def flatten(a):
             rt = []
             for x in a:
@@ -80,18 +287,60 @@ class Automator:
                     rt.append(x)
             return rt
 
-        args = []
-        for combination in combinations:
+        for combination in itertools.product(*values):
+            combination = flatten(combination)
+            yield [f"{keys[i]}={value}" for i, value in enumerate(combination)]
+
+    def generate_param_args(self, params_dict: Optional[dict] = None) -> List[List[str]]:
+        """
+        Generates the 'key=value' part of the arguments of every combination of the parameter dictionary
+
+        Returns:
+            List A of list B of strings, where each list B is the 'key=value' strings of 1 config
+        """
+        return list(self.iter_param_args(params_dict))
+
+    def count_args(self, params_dict: Optional[dict] = None) -> int:
+        """
+        Returns the number of combinations of the parameter dictionary without generating them
+
+        Examples:
+        >>> Automator().count_args({"a": [1, 2, 3], ("b", "c"): ([1, 2], [3, 4]), "d": [5]})
+        6
+        """
+        if params_dict is None:
+            params_dict = self.params_dict
+        count = 1
+        for value in params_dict.values():
+            count *= len(value)
+        return count
+
+    def iter_args(
+        self, mpi_count=None, params_dict: Optional[dict] = None, file_name: Optional[str] = None
+    ) -> Iterator[List[str]]:
+        """
+        Lazily generates the arguments of generate_args(), one config at a time
+        """
+        if file_name is None:
+            file_name = self.file_name
+        for param_args in self.iter_param_args(params_dict):
             lst = [self.cmd]
             if self.is_g4bl_mpi():
                 lst.append(str(mpi_count))
-            lst.append(self.file_name)
-            combination = flatten(combination)
-            for i, value in enumerate(combination):
-                lst.append(f"{keys[i]}={value}")
-            args.append(lst)
+            lst.append(file_name)
+            lst.extend(param_args)
+            yield lst
+
+    def generate_args(self, mpi_count=None) -> List[List[str]]:
+        """
+        Generates a list of arguments that is the first parameter for subprocess.run
 
-        return args
+
+        Returns:
+            List A of list B of strings, where each list B is 1 config to pass to the command line via subprocess.run
+        """
+
+        return list(self.iter_args(mpi_count))
 
     def tuple_zipl(self, args):
         """Return a tuple of list from the argument being a list of tuples"""
@@ -102,31 +351,311 @@ class Automator:
         a = tuple(tp)
         return a
 
-    def run_command(self, args):
+    def run_command(self, args, cwd=None) -> TaskResult:
         """
         Helper function for automate()
+
+        Args:
+            args:
+                the argument list of the command
+            cwd:
+                optional working directory of the command, created if needed.
+                G4Beamline writes its detector files there
+
+        Returns:
+            A TaskResult with the arguments, the exit code, the wall time, the CPU time (user + system)
+            and the max resident set size of the command, and the last lines of its stderr.
+            The resources come from os.wait4(), so they include the children the command waited for,
+            e.g. the ranks of g4blmpi
         """
         # print(f"Running {args}")
-        subprocess.run(args, stdout=subprocess.DEVNULL)
+        if cwd is not None:
+            os.makedirs(cwd, exist_ok=True)
+        start = time.perf_counter()
+        process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, cwd=cwd)
+        stderr_tail: Deque[str] = collections.deque(maxlen=STDERR_TAIL_LINES)
+        stderr = process.stderr
+        assert stderr is not None  # stderr=subprocess.PIPE
+        for line in stderr:
+            stderr_tail.append(line.decode(errors="replace").rstrip("\n"))
+        stderr.close()
+
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_time = time.perf_counter() - start
+        if os.WIFSIGNALED(status):
+            returncode = -os.WTERMSIG(status)
+        else:
+            returncode = os.WEXITSTATUS(status)
+        # let Popen know the process was reaped
+        process.returncode = returncode
+
+        # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+        max_rss_kb = usage.ru_maxrss / 1024 if sys.platform == "darwin" else usage.ru_maxrss
+        return TaskResult(
+            list(args),
+            returncode,
+            wall_time,
+            usage.ru_utime + usage.ru_stime,
+            max_rss_kb,
+            "\n".join(stderr_tail),
+        )
 
     # TODO: Return a function that takes in a configuration of unknown type, and the list of arguments, then output
     # a new list of that g4bl has never computed before,
     # in order for g4bl to not waste computation, and the physicist to not die waiting
 
+    def _run_part(self, part):
+        """
+        Helper function for automate(), runs one (job id, args, cwd) part of a task in a worker of the pool
+        """
+        job_id, args, cwd = part
+        return job_id, cwd, self.run_command(args, cwd)
+
+    def iter_adaptive_mpi(
+        self, parts: list, costs: List[float], total_cores: int, max_ranks: Optional[int] = None
+    ) -> Iterator:
+        """
+        Runs (job id, args, cwd) parts of g4blmpi tasks in the given order, each with its own number of MPI ranks,
+        and yields their results as they finish, like imap_unordered_bounded() does with a pool
+
+        Every part asks for desired_ranks() of total_cores according to its cost.
+        It starts as soon as launch_ranks() finds enough free cores, so the cores freed by finished tasks
+        go to the next ones right away, and the last tasks of the scan share whatever is left.
+
+        Args:
+            parts:
+                list of (job id, args, cwd), the rank count args[1] is replaced
+            costs:
+                the expected cost of every part
+            total_cores:
+                int, number of cores shared by all the ranks running at once
+            max_ranks:
+                int, optional cap on the ranks of one task
+        """
+        pending = collections.deque(zip(parts, desired_ranks(costs, total_cores, max_ranks)))
+        running: Dict[concurrent.futures.Future, int] = {}
+        free_cores = total_cores
+        # the work is done by the g4blmpi processes, threads only wait for them
+        with concurrent.futures.ThreadPoolExecutor(total_cores) as executor:
+            while pending or running:
+                while pending:
+                    (job_id, args, cwd), desired = pending[0]
+                    ranks = launch_ranks(desired, free_cores, len(pending), len(running), max_ranks)
+                    if ranks == 0:
+                        break
+                    pending.popleft()
+                    args = [args[0], str(ranks)] + args[2:]
+                    running[executor.submit(self._run_part, (job_id, args, cwd))] = ranks
+                    free_cores -= ranks
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    free_cores += running.pop(future)
+                    yield future.result()
+
+    @staticmethod
+    def resolve_output_directory(output_directory: Optional[str] = None, data_directory: Optional[str] = None) -> str:
+        """
+        Returns the absolute directory automate() writes the detector files to:
+        output_directory, else data_directory, else the current directory
+        """
+        if output_directory is None:
+            output_directory = os.getcwd() if data_directory is None else data_directory
+        return os.path.abspath(output_directory)
+
+    @staticmethod
+    def remove_stale_work_directories(output_directory: str) -> int:
+        """
+        Removes the task directories left in output_directory by an automate() of this host that was interrupted,
+        i.e. whose process is not running anymore, along with the partial outputs inside them.
+        The directories are named after the host and the process id of their automate(),
+        the ones of other hosts sharing output_directory (e.g. on a cluster file system) are left alone
+
+        Returns:
+            The number of directories removed
+        """
+        removed = 0
+        if not os.path.isdir(output_directory):
+            return removed
+        host = socket.gethostname()
+        with os.scandir(output_directory) as entries:
+            for entry in entries:
+                if not (entry.name.startswith(WORK_DIRECTORY_PREFIX) and entry.is_dir()):
+                    continue
+                # host names can hold dashes, the process id, job id and part come last
+                fields = entry.name[len(WORK_DIRECTORY_PREFIX):].rsplit("-", 3)
+                if len(fields) != 4 or fields[0] != host:
+                    continue
+                try:
+                    os.kill(int(fields[1]), 0)
+                    if int(fields[1]) != os.getpid():
+                        continue
+                except (ValueError, ProcessLookupError):
+                    pass
+                except PermissionError:
+                    # alive, owned by someone else
+                    continue
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    @staticmethod
+    def link_launch_directory(directory: str, launch_directory: str, names: List[str], skip_prefix: Optional[str] = None):
+        """
+        Creates a task directory holding a symbolic link to every entry of the directory automate() was called from,
+        so that the relative paths of the script (field maps, included files...) resolve as they did there
+
+        Args:
+            directory:
+                the task directory
+            launch_directory:
+                the directory automate() was called from
+            names:
+                the entries of launch_directory to link
+            skip_prefix:
+                optional prefix of the files the task writes, e.g. its detector files from a previous run,
+                which are not linked so that they are written anew instead of through the link
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in names:
+            if skip_prefix is None or not name.startswith(skip_prefix):
+                os.symlink(os.path.join(launch_directory, name), os.path.join(directory, name))
+
+    @staticmethod
+    def iter_written_files(directory: str) -> Iterator[os.DirEntry]:
+        """
+        Yields the regular files a task wrote in its directory, leaving out the links of link_launch_directory()
+        """
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    yield entry
+
+    @staticmethod
+    def commit_outputs(directory: str, output_directory: str) -> List[str]:
+        """
+        Moves every file a task wrote in its directory (detector files, histograms, ...) to output_directory.
+        os.replace() is atomic, so a file with the final name is always complete
+
+        Returns:
+            The paths of the files in output_directory
+        """
+        outputs = []
+        for entry in list(Automator.iter_written_files(directory)):
+            outputs.append(os.path.join(output_directory, entry.name))
+            os.replace(entry.path, outputs[-1])
+        return sorted(outputs)
+
+    def split_task(self, task_args: List[str], event_splits: int, events_param: str = "nEv") -> List[List[str]]:
+        """
+        Splits one task into sub-tasks over disjoint ranges of events
+
+        Args:
+            task_args:
+                the argument list of the task, it must set events_param
+            event_splits:
+                int, number of sub-tasks
+            events_param:
+                str, the parameter holding the number of events of the task
+
+        Returns:
+            The argument lists of the sub-tasks, which add first=... and last=... to task_args
+
+        Examples:
+        >>> Automator().split_task(["g4bl", "f.g4bl", "nEv=10"], 2)
+        [['g4bl', 'f.g4bl', 'nEv=10', 'first=1', 'last=5'], ['g4bl', 'f.g4bl', 'nEv=10', 'first=6', 'last=10']]
+        """
+        params = dict(param.split("=", 1) for param in RunManifest.task_params(task_args))
+        if events_param not in params:
+            raise ValueError(f"Splitting a task by events needs the parameter {events_param} in {task_args}")
+        return [
+            task_args + [f"{FIRST_EVENT_PARAM}={first}", f"{LAST_EVENT_PARAM}={last}"]
+            for first, last in split_event_ranges(int(float(params[events_param])), event_splits)
+        ]
+
     def automate(
         self,
-        param_dict: dict = None,
-        file_name: str = None,
+        param_dict: Optional[dict] = None,
+        file_name: Optional[str] = None,
         total_process_count=1,
         mpi_count=None,
         detector_lst=None,
         data_directory=None,
+        manifest_file=None,
+        count_only=False,
+        cost_fn=None,
+        longest_first_order=False,
+        run_log=None,
+        event_splits=1,
+        events_param="nEv",
+        adaptive_mpi=False,
+        max_mpi_count=None,
+        resume=False,
+        output_directory=None,
     ):
         """
         Automating, automating, gaslighting, girlbossing, gatekeeping, mmm-kayyyy
 
         Automate the search space/high parameter space with G4Beamline,
         refers to the link of Automation in the Documentation page
+
+        Args:
+            manifest_file:
+                str, optional path to a RunManifest database. Tasks that already completed with the same command,
+                the same script contents and the same parameters, and whose detector files are still there,
+                are skipped, and the outcome and files of every task that runs are recorded in it.
+                The manifest then replaces the per-file check of data_directory
+            count_only:
+                bool, if True nothing is run and the number of tasks that would run is returned
+            cost_fn:
+                optional function from the argument list of a task to its expected cost (e.g. seconds).
+                Giving it turns on longest_first_order
+            longest_first_order:
+                bool, if True the tasks are dispatched by decreasing cost so that a few long tasks do not
+                start last and leave every other core idle. Without cost_fn, the costs are the runtimes
+                recorded in manifest_file. The tasks are then held in memory to be sorted,
+                and the projected and actual makespans are reported at the end.
+                The projected one is in the unit of cost_fn, or in seconds when it comes from the runtimes
+            run_log:
+                str, optional JSON-lines file that every task's TaskResult is appended to,
+                see RunReport.load(). A summary of the run is printed at the end either way
+            event_splits:
+                int, if more than 1 every task is split into that many sub-jobs over disjoint ranges of events
+                (see split_task()), run in parallel in their own directories. Their detector files are then
+                concatenated into data_directory (or the current directory) under the usual names.
+                The beam command of the script must read the range, e.g.
+                beam gaussian ... firstEvent=$first lastEvent=$last, with param -unset first=1 last=$nEv.
+                G4Beamline seeds the random numbers of each event with its event number by default,
+                so the concatenated files hold the same events as one big run
+            events_param:
+                str, the parameter holding the number of events of a task, defaults to nEv
+            adaptive_mpi:
+                bool, for g4blmpi only. If True, mpi_count is ignored and every task gets its own number of
+                MPI ranks out of total_process_count cores, from its expected cost
+                (cost_fn, or the runtimes of manifest_file) relative to the balanced load of a core, see desired_ranks().
+                Cheap tasks run on one rank side by side and expensive ones get many,
+                and the cores freed by finished tasks go to the next task right away.
+                The tasks are dispatched longest first
+            max_mpi_count:
+                int, optional cap on the MPI ranks of one task with adaptive_mpi
+            resume:
+                bool, defaults to False. If True and no manifest_file is given, the outcome of every task
+                is journaled in the RunManifest JOURNAL_FILE of the output directory,
+                so that running automate() again with resume=True after an interruption only runs the tasks
+                that did not finish, or whose detector files were removed since
+            output_directory:
+                str, optional directory the detector files and the journal go to,
+                defaults to data_directory or the current directory
+
+        Every task runs in its own directory inside the output directory,
+        and the files it wrote are moved to their final names only once it exited with code 0.
+        An interrupted or failed task therefore never leaves a partial file that looks complete.
+        The script and any relative path to the command are made absolute for this,
+        and the task directory links every entry of the current directory (see link_launch_directory()),
+        so relative paths inside the script (e.g. field maps) still resolve from the current directory.
+        The directories left by an interrupted run are removed when automate() starts.
+
+        Tasks are generated, filtered and fed to the pool lazily,
+        so the memory used stays the same however big the grid of parameters is.
         Links:
             https://badumbatish.github.io/fermi_proj/automation/
         """
@@ -138,31 +667,477 @@ class Automator:
         if (param_dict is None) or (file_name is None):
             raise ValueError(
                 "param_dict and file_name must be set either through automate() or set_params_dict() and set_file_name()")
-        args = self.generate_args(str(mpi_count))
+        if adaptive_mpi and not self.is_g4bl_mpi():
+            raise ValueError("adaptive_mpi needs g4blmpi as the command")
+        output_directory = self.resolve_output_directory(output_directory, data_directory)
+        os.makedirs(output_directory, exist_ok=True)
+        # tasks run in their own directories, the script has to be found from there
+        file_name = os.path.abspath(file_name)
+        # the same command has to be in the args that are filtered, run and recorded in the manifest
+        cmd = os.path.abspath(self.cmd) if os.sep in self.cmd else self.cmd
+        if not count_only:
+            removed = self.remove_stale_work_directories(output_directory)
+            if removed:
+                print(f"Removed {removed} task directories left by an interrupted run in {output_directory}")
+        journal_file = os.path.join(output_directory, JOURNAL_FILE)
+        if manifest_file is None and resume and (not count_only or os.path.exists(journal_file)):
+            manifest_file = journal_file
+
+        tasks: Iterable[List[str]] = ([cmd] + arg[1:] for arg in self.iter_args(str(mpi_count), param_dict, file_name))
+        # the number of tasks is only known in advance when none of them can be skipped
+        total: Optional[int] = self.count_args(param_dict)
+
+        manifest = None
+        if manifest_file is not None:
+            # the manifest alone decides what is left to run, tasks whose recorded files are gone run again
+            manifest = RunManifest(manifest_file)
+            script_digest = RunManifest.hash_file(file_name)
+            completed = manifest.completed_keys(check_outputs=True)
+            tasks = (arg for arg in tasks if RunManifest.task_key(arg, script_digest) not in completed)
+            total = None
+        elif not (data_directory is None):
+            tasks = self.iter_skip_task_by_list(tasks, detector_lst, data_directory)
+            total = None
 
-        if not (data_directory is None):
-            args = self.skip_task_by_list(args, detector_lst, data_directory)
+        if count_only:
+            if manifest is not None:
+                manifest.close()
+            return total if total is not None else sum(1 for _ in tasks)
 
-        if mpi_count is None:
+        if adaptive_mpi:
+            longest_first_order = True
+            process_count = int(total_process_count)
+        elif mpi_count is None:
             process_count = int(total_process_count)
         else:
             process_count = int(total_process_count / int(mpi_count))
 
+        projected = None
+        costs: List[float] = []
+        if cost_fn is not None or longest_first_order:
+            task_list = list(tasks)
+            history = None if manifest is None else manifest.runtimes()
+            estimated_costs = estimate_costs(task_list, cost_fn, history, RunManifest.task_params)
+            # only the runtimes of the manifest are seconds, cost_fn can be in any unit
+            cost_unit = "s" if cost_fn is None and history else "cost units"
+            order = longest_first(estimated_costs)
+            tasks = [task_list[i] for i in order]
+            costs = [estimated_costs[i] for i in order]
+            if not adaptive_mpi:
+                projected = projected_makespan(costs, process_count)
+            total = len(task_list)
+
+        # every task is a job of one or more parts, a job is finished once all its parts came back
+        jobs = {}
+
+        work_prefix = f"{WORK_DIRECTORY_PREFIX}{socket.gethostname()}-{os.getpid()}-"
+        launch_directory = os.getcwd()
+        launch_names = [
+            name for name in os.listdir(launch_directory) if not name.startswith(".g4bl") and name != JOURNAL_FILE
+        ]
+
+        def parts_of(tasks):
+            for job_id, task_args in enumerate(tasks):
+                sub_tasks = [task_args] if event_splits <= 1 else self.split_task(task_args, event_splits, events_param)
+                jobs[job_id] = {"args": task_args, "parts": len(sub_tasks), "remaining": len(sub_tasks), "results": {}}
+                # the detector files of the task start with the stem of its parameters
+                stems = self.task_output_files(task_args)
+                for k, sub_task in enumerate(sub_tasks):
+                    directory = os.path.join(output_directory, f"{work_prefix}{job_id}-{k}")
+                    self.link_launch_directory(
+                        directory, launch_directory, launch_names, stems[0][: -len(".txt")] if stems else None
+                    )
+                    yield job_id, sub_task, directory
+
+        def finish(job) -> Tuple[TaskResult, List[str]]:
+            directories = sorted(job["results"], key=lambda d: int(d.rsplit("-", 1)[1]))
+            results = [job["results"][directory] for directory in directories]
+            # the args of a single part carry the rank count it actually ran with
+            result = TaskResult.combine(results[0].args if len(results) == 1 else job["args"], results)
+            outputs = []
+            if result.returncode == 0:
+                if len(directories) == 1:
+                    outputs = self.commit_outputs(directories[0], output_directory)
+                else:
+                    outputs = self.concatenate_parts(directories, output_directory)
+            for directory in directories:
+                if result.returncode == 0 and any(self.iter_written_files(directory)):
+                    # the other outputs of the sub-jobs can not be concatenated, they are kept as they are
+                    kept = os.path.join(
+                        output_directory, KEPT_DIRECTORY_PREFIX + os.path.basename(directory)[len(WORK_DIRECTORY_PREFIX):]
+                    )
+                    os.replace(directory, kept)
+                    print(f"Kept the other files of {' '.join(RunManifest.task_params(job['args']))} in {kept}")
+                else:
+                    shutil.rmtree(directory, ignore_errors=True)
+            return result, outputs
+
         print(
             f"Creating pool with total process count = {total_process_count},"
             f"pool process count = "
             "{process_count}, G4BLMPI process count = {mpi_count}"
         )
-        with mp.Pool(process_count) as p:
-            # color is pastel pink hehe
-            list(
-                tqdm.tqdm(
-                    p.imap_unordered(self.run_command, args),
-                    total=len(args),
-                    colour="#F8C8DC",
-                    desc="Batch progress bar",
+        report = RunReport(run_log)
+        start = time.perf_counter()
+        # color is pastel pink hehe
+        with contextlib.ExitStack() as stack:
+            bar = stack.enter_context(tqdm.tqdm(total=total, colour="#F8C8DC", desc="Batch progress bar"))
+            if adaptive_mpi:
+                parts = list(parts_of(tasks))
+                part_costs = [costs[job_id] / jobs[job_id]["parts"] for job_id, _, _ in parts]
+                results = self.iter_adaptive_mpi(parts, part_costs, process_count, max_mpi_count)
+            else:
+                p = stack.enter_context(mp.Pool(process_count))
+                # longest first only holds if tasks are handed out one at a time, in order
+                results = imap_unordered_bounded(
+                    p, self._run_part, parts_of(tasks), TASKS_AHEAD_PER_PROCESS * process_count
                 )
+            for job_id, directory, part_result in results:
+                job = jobs[job_id]
+                job["results"][directory] = part_result
+                job["remaining"] -= 1
+                if job["remaining"] > 0:
+                    continue
+
+                del jobs[job_id]
+                result, outputs = finish(job)
+                report.add(result)
+                bar.update(1)
+                if manifest is not None:
+                    manifest.record(
+                        RunManifest.task_key(result.args, script_digest),
+                        result.args,
+                        RunManifest.DONE if result.returncode == 0 else RunManifest.FAILED,
+                        outputs,
+                        result.wall_time,
+                    )
+        makespan = time.perf_counter() - start
+
+        print(report)
+        if projected is not None:
+            print(f"Projected makespan = {projected:.1f} {cost_unit}, actual makespan = {makespan:.1f} s")
+
+        if manifest is not None:
+            manifest.close()
+
+    def evaluate(
+        self,
+        param_args: List[str],
+        objective: Callable[[Dict[str, DataAnalyzer]], float],
+        detector_lst=None,
+        data_directory=None,
+        analyzer_kwargs: Optional[dict] = None,
+    ) -> float:
+        """
+        Computes an objective on the detector files of one task
+
+        Args:
+            param_args:
+                the 'key=value' parameters of the task
+            objective:
+                function from a dictionary of the DataAnalyzer of every detector of the task (keyed by the detector
+                postfix, or None without detector_lst) to a number
+            detector_lst:
+                the postfixes of the detectors, as in automate()
+            data_directory:
+                directory of the detector files, defaults to the current directory
+            analyzer_kwargs:
+                optional keyword arguments for every DataAnalyzer, e.g. columns=[...]
+
+        Returns:
+            The objective, NaN if a file is missing (e.g. the task failed)
+        """
+        files = self.task_output_files([self.cmd] + list(param_args), detector_lst, data_directory)
+        if not files or not all(os.path.exists(file) for file in files):
+            return np.nan
+        analyzers = {
+            detector: DataAnalyzer(file, **(analyzer_kwargs or {}))
+            for detector, file in zip(detector_lst or [None], files)
+        }
+        return float(objective(analyzers))
+
+    def search(
+        self,
+        bounds: Dict[str, tuple],
+        objective: Callable[[Dict[str, DataAnalyzer]], float],
+        fixed_params: Optional[dict] = None,
+        batch_size: int = 8,
+        rounds: int = 4,
+        shrink: float = 0.5,
+        maximize: bool = True,
+        seed=None,
+        detector_lst=None,
+        analyzer_kwargs: Optional[dict] = None,
+        **automate_kwargs,
+    ) -> pd.DataFrame:
+        """
+        Searches the numeric ranges of some parameters for the best value of an objective,
+        instead of running the whole grid of generate_args()
+
+        Every round draws batch_size points by latin_hypercube() in the current box and runs them
+        in parallel through automate(). Then the box shrinks by shrink around the best point found so far,
+        so the search goes from coarse to fine. 4 rounds of 8 points are 32 runs, where a grid of
+        10 values for 5 magnet parameters would be 100000.
+
+        Args:
+            bounds:
+                dictionary from parameter names to their (low, high) range.
+                Ranges given as two ints only try integer values
+            objective:
+                function of the detector files of a run to a number, see evaluate(), e.g.
+                lambda analyzers: analyzers["Det"].get_particle_count("mu-")
+            fixed_params:
+                optional dictionary of the other parameters of the script, one value each.
+                The parameters come in the order of bounds then fixed_params,
+                which must be the order of the rename of the detectors in the script
+            batch_size:
+                int, number of runs per round, ideally a multiple of the number of processes
+            rounds:
+                int, number of rounds
+            shrink:
+                float, the box of the next round is this fraction of the current one
+            maximize:
+                bool, maximize the objective, minimize it if False
+            seed:
+                optional seed of the random points
+            detector_lst:
+                the postfixes of the detectors, as in automate()
+            analyzer_kwargs:
+                optional keyword arguments for every DataAnalyzer, e.g. columns=[...]
+            automate_kwargs:
+                passed on to automate(), e.g. total_process_count. The outputs are read from the directory
+                automate() writes them to, see resolve_output_directory()
+
+        Returns:
+            A pandas DataFrame of every run: one column per parameter of bounds, the "round" and the "objective",
+            best first. Runs that failed have a NaN objective.
+            A point is only run once: the ones drawn again within a round or from an earlier round are skipped
+        """
+        names = list(bounds)
+        limits = [tuple(bounds[name]) for name in names]
+        integers = [all(isinstance(limit, (int, np.integer)) for limit in bound) for bound in limits]
+        fixed = {name: [value] for name, value in (fixed_params or {}).items()}
+        rng = np.random.default_rng(seed)
+        output_directory = self.resolve_output_directory(
+            automate_kwargs.get("output_directory"), automate_kwargs.get("data_directory")
+        )
+        automate_kwargs = {**automate_kwargs, "output_directory": output_directory}
+
+        box = [(float(low), float(high)) for low, high in limits]
+        records = []
+        best = None
+        evaluated: Set[Tuple] = set()
+        for round_index in range(rounds):
+            # rounding (e.g. of integer ranges) can draw a point twice, or one of an earlier round
+            points = [
+                list(point) for point in dict.fromkeys(
+                    tuple(format_value(value, integer) for value, integer in zip(point, integers))
+                    for point in latin_hypercube(batch_size, box, rng)
+                )
+                if point not in evaluated
+            ]
+            evaluated.update(tuple(point) for point in points)
+            if not points:
+                continue
+            param_dict = {tuple(names): points}
+            param_dict.update(fixed)
+            self.automate(param_dict=param_dict, detector_lst=detector_lst, **automate_kwargs)
+
+            for point, param_args in zip(points, self.iter_param_args(param_dict)):
+                value = self.evaluate(param_args, objective, detector_lst, output_directory, analyzer_kwargs)
+                record = dict(zip(names, (float(value) for value in point)))
+                record.update({"round": round_index, "objective": value})
+                records.append(record)
+                if not np.isnan(value) and (
+                    best is None or (value > best["objective"] if maximize else value < best["objective"])
+                ):
+                    best = record
+
+            if best is not None:
+                box = shrink_bounds(box, [best[name] for name in names], shrink, limits)
+
+        frame = pd.DataFrame.from_records(records)
+        frame = frame.sort_values("objective", ascending=not maximize, na_position="last", kind="stable")
+        if best is not None:
+            print(f"Best objective = {best['objective']:.6g} at " + ", ".join(f"{name}={best[name]:.6g}" for name in names))
+        return frame.reset_index(drop=True)
+
+    def successive_halving(
+        self,
+        objective: Callable[[Dict[str, DataAnalyzer]], float],
+        max_events: int,
+        min_events: Optional[int] = None,
+        eta: int = 3,
+        param_dict: Optional[dict] = None,
+        events_param: str = "nEv",
+        maximize: bool = True,
+        detector_lst=None,
+        analyzer_kwargs: Optional[dict] = None,
+        **automate_kwargs,
+    ) -> pd.DataFrame:
+        """
+        Runs every configuration of the parameter dictionary at low statistics,
+        and only the most promising ones at higher and higher statistics
+
+        The first rung runs every configuration with min_events events. Each next rung keeps the best 1/eta of the
+        configurations, by objective, and runs them with eta times more events, up to max_events.
+        A configuration is never simulated twice: a rung only runs the new events
+        (first=previous + 1, last=new, as with automate(event_splits=...)), and they are appended to the detector
+        files of the rung before. With eta=3 and 4 rungs, every rung costs about the same,
+        which is 4/27 of running everything at max_events.
+
+        The script must set the number of events with events_param and read the range of events,
+        e.g. beam gaussian ... firstEvent=$first lastEvent=$last, with param -unset first=1 last=$nEv.
+        events_param has to be in the rename of the detectors, so that every rung has its own files.
+        Its place among the parameters is its place in param_dict, or the last one if it is not in it.
+
+        Args:
+            objective:
+                function of the detector files of a run to a number, see evaluate()
+            max_events:
+                int, number of events of the last rung
+            min_events:
+                int, number of events of the first rung, defaults to max_events / eta ** 3
+            eta:
+                int, ratio of events between rungs and of configurations kept
+            param_dict:
+                the parameter dictionary of the scan, defaults to the one of set_params_dict()
+            events_param:
+                str, the parameter holding the number of events, defaults to nEv
+            maximize:
+                bool, keep the largest objectives, the smallest if False
+            detector_lst:
+                the postfixes of the detectors, as in automate()
+            analyzer_kwargs:
+                optional keyword arguments for every DataAnalyzer
+            automate_kwargs:
+                passed on to automate(), e.g. total_process_count. The outputs go to output_directory,
+                else data_directory, else the current directory
+
+        Returns:
+            A pandas DataFrame of every run: the "configuration" (its parameters), the "rung",
+            its events_param and the "objective", the best of the last rung first
+        """
+        if param_dict is None:
+            param_dict = self.params_dict
+        if min_events is None:
+            min_events = max(1, max_events // eta**3)
+        levels = [int(max_events)]
+        while levels[-1] // eta >= min_events:
+            levels.append(levels[-1] // eta)
+        levels.reverse()
+
+        names = list(param_dict)
+        position = names.index(events_param) if events_param in names else len(names)
+        config_dict = {name: values for name, values in param_dict.items() if name != events_param}
+
+        def with_events(config: List[str], events: int) -> List[str]:
+            return config[:position] + [f"{events_param}={events}"] + config[position:]
+
+        def run(configs: List[List[str]], output_directory: str):
+            keys = [arg.split("=", 1)[0] for arg in configs[0]]
+            self.automate(
+                param_dict={tuple(keys): [[arg.split("=", 1)[1] for arg in config] for config in configs]},
+                detector_lst=detector_lst,
+                output_directory=output_directory,
+                **automate_kwargs,
+            )
+
+        automate_kwargs = dict(automate_kwargs)
+        output_directory = self.resolve_output_directory(
+            automate_kwargs.pop("output_directory", None), automate_kwargs.get("data_directory")
+        )
+        increments = os.path.join(output_directory, ".g4bl-increments")
+        candidates = list(self.iter_param_args(config_dict))
+        records = []
+        previous = None
+        for rung, events in enumerate(levels):
+            args = [with_events(config, events) for config in candidates]
+            missing = [
+                (config, task_args) for config, task_args in zip(candidates, args)
+                if not all(
+                    os.path.exists(file)
+                    for file in self.task_output_files([self.cmd] + task_args, detector_lst, output_directory)
+                )
+            ]
+            if missing and previous is not None:
+                # only the new events, appended to the files of the previous rung
+                run(
+                    [
+                        task_args + [f"{FIRST_EVENT_PARAM}={previous + 1}", f"{LAST_EVENT_PARAM}={events}"]
+                        for _, task_args in missing
+                    ],
+                    increments,
+                )
+                for config, task_args in missing:
+                    old_files = self.task_output_files(
+                        [self.cmd] + with_events(config, previous), detector_lst, output_directory
+                    )
+                    new_files = self.task_output_files([self.cmd] + task_args, detector_lst, increments)
+                    final_files = self.task_output_files([self.cmd] + task_args, detector_lst, output_directory)
+                    if all(os.path.exists(file) for file in old_files + new_files):
+                        for old_file, new_file, final_file in zip(old_files, new_files, final_files):
+                            concatenate_detector_files([old_file, new_file], final_file)
+                            os.remove(new_file)
+            elif missing:
+                run([task_args for _, task_args in missing], output_directory)
+
+            scores = [
+                self.evaluate(task_args, objective, detector_lst, output_directory, analyzer_kwargs) for task_args in args
+            ]
+            for config, score in zip(candidates, scores):
+                records.append({"configuration": " ".join(config), "rung": rung, events_param: events, "objective": score})
+
+            order = sorted(
+                (i for i in range(len(candidates)) if not np.isnan(scores[i])),
+                key=lambda i: scores[i],
+                reverse=maximize,
             )
+            keep = max(1, -(-len(candidates) // eta))
+            candidates = [candidates[i] for i in order[:keep]]
+            previous = events
+            if not candidates:
+                break
+
+        frame = pd.DataFrame.from_records(records)
+        frame = frame.sort_values(["rung", "objective"], ascending=[False, not maximize], na_position="last", kind="stable")
+        return frame.reset_index(drop=True)
+
+    @staticmethod
+    def concatenate_parts(directories: List[str], output_directory: str) -> List[str]:
+        """
+        Concatenates the detector files (.txt) that the sub-jobs of a split task wrote in their directories,
+        in the order of the directories, into output_directory under the same names.
+        The part files are removed once concatenated
+
+        Returns:
+            The paths of the concatenated files in output_directory
+        """
+        names = sorted(
+            {entry.name for directory in directories for entry in Automator.iter_written_files(directory)
+             if entry.name.endswith(".txt")}
+        )
+        for name in names:
+            part_files = [os.path.join(directory, name) for directory in directories]
+            part_files = [part_file for part_file in part_files if os.path.isfile(part_file)]
+            concatenate_detector_files(part_files, os.path.join(output_directory, name))
+            for part_file in part_files:
+                os.remove(part_file)
+        return [os.path.join(output_directory, name) for name in names]
+
+    def task_output_files(self, task_args: List[str], detector_lst=None, data_directory=None) -> List[str]:
+        """
+        Returns the paths of the detector files one task writes, following construct_list_files().
+        The event range of split or incremental runs is not part of the names
+        """
+        event_range = (f"{FIRST_EVENT_PARAM}=", f"{LAST_EVENT_PARAM}=")
+        filtered_args = self.filter_args([[arg for arg in task_args if not arg.startswith(event_range)]])
+        if not filtered_args:
+            return []
+        files = self.construct_list_files(filtered_args, detector_lst)[0]
+        if data_directory is not None:
+            files = [os.path.join(data_directory, file) for file in files]
+        return files
 
     def filter_args(self, arg_lists: List[List[str]]) -> List[List[str]]:
         """
@@ -237,34 +1212,49 @@ class Automator:
         result = recursively_add_txt(result)
         return result
 
-    def all_file_exists(self, data_list, data_directory=None, test=False) -> bool:
+    def list_data_directory(self, data_directory=None, test=False) -> Set[str]:
         """
-        Returns:
-            A boolean value that returns True if all the files in data_list,
-             located in data_directory. It'll return false if one or more files is not present.
-
+        Lists the names of the files in data_directory with a single os.scandir pass,
+        so that checking the existence of a file is a set lookup instead of a stat call on the file system
 
+        Returns:
+            A set of file names, empty if data_directory does not exist
         """
-        all_files_exist = True
-
         if test is True:
             relative_dir_path = "tests/unit/test_data/remembrance/"
             data_directory = os.path.join(os.getcwd(), relative_dir_path)
+        if data_directory is None:
+            data_directory = os.getcwd()
+
+        try:
+            with os.scandir(data_directory) as entries:
+                return {entry.name for entry in entries if not entry.is_dir()}
+        except FileNotFoundError:
+            return set()
+
+    def all_file_exists(self, data_list, data_directory=None, test=False, existing_files=None) -> bool:
+        """
+        Args:
+            existing_files:
+                optional set of the file names in data_directory, as returned by list_data_directory().
+                It is built when not given.
+        Returns:
+            A boolean value that returns True if all the files in data_list,
+             located in data_directory. It'll return false if one or more files is not present.
 
-        for data_file in data_list:
-            file_path = data_directory + data_file
 
-            if not exists(file_path):
-                print(f"File not found: {file_path}")
-                all_files_exist = False
+        """
+        if existing_files is None:
+            existing_files = self.list_data_directory(data_directory, test)
 
-        return all_files_exist
+        return all(data_file in existing_files for data_file in data_list)
 
     def get_index_of_needed_tasks(
         self, data_list, data_directory=None, test=False
     ) -> List[bool]:
         """
         Determines which tasks need to be executed based on the existence of their associated data files.
+        The directory is listed once, and the missing files are reported in a single summary line.
 
         Args:
             data_list (List[str]): List of data file names or paths associated with tasks.
@@ -276,17 +1266,53 @@ class Automator:
             whether the task associated with the corresponding index in `data_files` needs to be executed
             (True if it does not exist and False otherwise).
         """
+        existing_files = self.list_data_directory(data_directory, test)
+
+        missing = [file for files in data_list for file in files if file not in existing_files]
+        if missing:
+            examples = ", ".join(missing[:3])
+            print(
+                f"{len(missing)} of {sum(len(files) for files in data_list)} files not found "
+                f"in {data_directory}, e.g. {examples}"
+            )
+
         # Determine the existence of each file
         # and return the negation (True if file does not exist and hence task is needed)
         return [
-            bool(self.all_file_exists(file, data_directory, test)) for file in data_list
+            not self.all_file_exists(file, data_directory, test, existing_files) for file in data_list
         ]
 
+    def iter_skip_task_by_list(
+        self,
+        tasks: Iterable[List[str]],
+        postfixes: List[str],
+        data_directory: Optional[str] = None,
+        test: bool = False,
+    ) -> Iterator[List[str]]:
+        """
+        Lazy version of skip_task_by_list(): the data directory is listed once,
+        then every task is checked as it is pulled, without building the list of tasks or of their files.
+        The number of missing files is reported once the tasks are exhausted.
+        """
+        existing_files = self.list_data_directory(data_directory, test)
+        missing = 0
+        expected = 0
+        for task in tasks:
+            filtered_args = self.filter_args([task])
+            task_files = self.construct_list_files(filtered_args, postfixes)[0] if filtered_args else []
+            expected += len(task_files)
+            missing += sum(file not in existing_files for file in task_files)
+            if not self.all_file_exists(task_files, existing_files=existing_files):
+                yield task
+
+        if missing:
+            print(f"{missing} of {expected} files not found in {data_directory}")
+
     def skip_task_by_list(
         self,
         tasks: List[List[str]],
         postfixes: List[str],
-        data_directory: str = None,
+        data_directory: Optional[str] = None,
         test: bool = False,
     ) -> List[List[str]]:
         """
@@ -301,11 +1327,4 @@ class Automator:
         Returns:
             List[str]: List of tasks that have not yet been computed.
         """
-        filtered_args = self.filter_args(tasks)
-        task_files = self.construct_list_files(filtered_args, postfixes)
-        needed_task_indices = self.get_index_of_needed_tasks(
-            task_files, data_directory, test
-        )
-
-        # Select and return tasks that have not been completed yet
-        return [tasks[i] for i, needed in enumerate(needed_task_indices) if needed]
+        return list(self.iter_skip_task_by_list(tasks, postfixes, data_directory, test))
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from g4bl_suite.DataAnalyzer import CHUNK_ROWS, DataAnalyzer, ParticleGroups
+from g4bl_suite.GlobalVariables import feature_dict, particle_dict, particle_mass
+
+# The variables PhaseSpaceMoments accumulates, in the order of its mean and covariance.
+# Positions are in mm, angles in milliradian (like DataAnalyzer.get_x_angle()) and momenta in MeV/c
+VARIABLES = ("x", "x_angle", "y", "y_angle", "Px", "Py", "Pz", "P")
+_index = {name: i for i, name in enumerate(VARIABLES)}
+
+# Key of the statistics of every track, whatever its species
+ALL = "all"
+
+
+def phase_space(data) -> np.ndarray:
+    """
+    Returns the VARIABLES of every row of detector data as a (rows, 8) array, in one pass over the columns
+    """
+    rows = len(data)
+    result = np.empty((rows, len(VARIABLES)))
+    for name in ("x", "y", "Px", "Py", "Pz"):
+        result[:, _index[name]] = data[:, feature_dict[name]]
+    p_z = result[:, _index["Pz"]]
+    np.divide(result[:, _index["Px"]], p_z, out=result[:, _index["x_angle"]])
+    np.divide(result[:, _index["Py"]], p_z, out=result[:, _index["y_angle"]])
+    result[:, [_index["x_angle"], _index["y_angle"]]] *= 1000
+    result[:, _index["P"]] = np.sqrt(np.einsum("ij,ij->i", result[:, 4:7], result[:, 4:7]))
+    return result
+
+
+class PhaseSpaceMoments:
+    """Weighted mean and covariance of the VARIABLES of a set of tracks, accumulated block by block
+
+    The state is the number of tracks, the sum of their weights, the weighted mean and the weighted
+    sum of outer products of the deviations from the mean. Two states merge exactly with the
+    pairwise update of Chan et al., so blocks, files and processes can be combined in any order
+    without the loss of precision of summing raw second moments.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.weight = 0.0
+        self.mean = np.zeros(len(VARIABLES))
+        self.comoment = np.zeros((len(VARIABLES), len(VARIABLES)))
+
+    @staticmethod
+    def from_values(values: np.ndarray, weights: Optional[np.ndarray] = None) -> PhaseSpaceMoments:
+        """
+        Builds the moments of a (rows, 8) array of phase_space() values
+        """
+        moments = PhaseSpaceMoments()
+        if values.shape[0] == 0:
+            return moments
+        if weights is None:
+            weights = np.ones(values.shape[0])
+        moments.count = values.shape[0]
+        moments.weight = float(weights.sum())
+        if moments.weight == 0:
+            return moments
+        moments.mean = weights @ values / moments.weight
+        deviations = values - moments.mean
+        moments.comoment = (deviations * weights[:, None]).T @ deviations
+        return moments
+
+    def merge(self, other: PhaseSpaceMoments) -> PhaseSpaceMoments:
+        """
+        Adds the tracks of other to self and returns self
+        """
+        weight = self.weight + other.weight
+        if other.weight == 0 or weight == 0:
+            self.count += other.count
+            return self
+        delta = other.mean - self.mean
+        self.comoment = self.comoment + other.comoment + np.outer(delta, delta) * self.weight * other.weight / weight
+        self.mean = self.mean + delta * other.weight / weight
+        self.weight = weight
+        self.count += other.count
+        return self
+
+    def covariance(self) -> np.ndarray:
+        """
+        Returns the weighted (population) covariance matrix of the VARIABLES
+        """
+        if self.weight == 0:
+            return np.full_like(self.comoment, np.nan)
+        return self.comoment / self.weight
+
+    def _plane(self, plane: str):
+        covariance = self.covariance()
+        position, angle = _index[plane], _index[f"{plane}_angle"]
+        return covariance[position, position], covariance[position, angle], covariance[angle, angle]
+
+    def emittance(self, plane: str = "x") -> float:
+        """
+        Returns the geometric RMS emittance sqrt(<x^2><x'^2> - <xx'>^2) of a plane ("x" or "y"), in mm mrad
+        """
+        xx, xa, aa = self._plane(plane)
+        return float(np.sqrt(max(xx * aa - xa**2, 0.0)))
+
+    def normalized_emittance(self, mass: float, plane: str = "x") -> float:
+        """
+        Returns the normalized RMS emittance sqrt(<x^2><Px^2> - <xPx>^2) / (m c) of a plane, in mm
+
+        Args:
+            mass:
+                float, rest mass of the particles in MeV/c^2, see GlobalVariables.particle_mass
+        """
+        covariance = self.covariance()
+        position, momentum = _index[plane], _index[f"P{plane}"]
+        determinant = covariance[position, position] * covariance[momentum, momentum] - covariance[position, momentum] ** 2
+        return float(np.sqrt(max(determinant, 0.0)) / mass) if mass else np.nan
+
+    def twiss(self, plane: str = "x") -> Dict[str, float]:
+        """
+        Returns the Twiss parameters of a plane: alpha, beta (in m, i.e. mm/mrad) and gamma (in 1/m)
+        """
+        xx, xa, aa = self._plane(plane)
+        emittance = self.emittance(plane)
+        if not emittance:
+            return {"alpha": np.nan, "beta": np.nan, "gamma": np.nan}
+        return {"alpha": -xa / emittance, "beta": xx / emittance, "gamma": aa / emittance}
+
+
+class BeamStatistics:
+    """Beam optics statistics of detector data, for every species and for the whole beam
+
+    Every block of tracks goes through phase_space() and one weighted PhaseSpaceMoments per species,
+    the rows of each species being found by ParticleGroups. Files are streamed with from_file(),
+    and statistics of several blocks, files or workers are combined with merge().
+    The Weight column of G4Beamline weighs every track.
+
+    Examples:
+    >>> data = np.zeros((4, 12))
+    >>> data[:, feature_dict["x"]] = [-1, 1, -1, 1]
+    >>> data[:, feature_dict["Px"]] = [-1, -1, 1, 1]
+    >>> data[:, feature_dict["Pz"]] = 100
+    >>> data[:, feature_dict["PDGid"]] = 13
+    >>> data[:, feature_dict["Weight"]] = 1
+    >>> round(BeamStatistics(data).emittance("mu-"), 6)
+    10.0
+    """
+
+    def __init__(self, data=None):
+        self.moments: Dict = {}
+        if data is not None:
+            self.update(data)
+
+    def update(self, data) -> BeamStatistics:
+        """
+        Adds a block of detector data (a 2D array or a CompactData) and returns self
+        """
+        if len(data) == 0:
+            return self
+        values = phase_space(data)
+        weights = np.asarray(data[:, feature_dict["Weight"]], dtype=np.float64)
+        self._add(ALL, PhaseSpaceMoments.from_values(values, weights))
+        groups = ParticleGroups(data)
+        for pid in groups.ids:
+            rows = groups.get_rows(particle_id=pid)
+            self._add(int(pid), PhaseSpaceMoments.from_values(values[rows], weights[rows]))
+        return self
+
+    def _add(self, key, moments: PhaseSpaceMoments):
+        if key in self.moments:
+            self.moments[key].merge(moments)
+        else:
+            self.moments[key] = moments
+
+    def merge(self, other: BeamStatistics) -> BeamStatistics:
+        """
+        Adds the statistics of other, e.g. of another file, and returns self
+        """
+        for key, moments in other.moments.items():
+            copy = PhaseSpaceMoments().merge(moments)
+            self._add(key, copy)
+        return self
+
+    @staticmethod
+    def from_file(file_name: str, rows: int = CHUNK_ROWS) -> BeamStatistics:
+        """
+        Computes the statistics of a detector file with DataAnalyzer.iter_chunks(), so the memory stays bounded
+        """
+        statistics = BeamStatistics()
+        for chunk in DataAnalyzer.iter_chunks(file_name, rows):
+            statistics.update(chunk)
+        return statistics
+
+    def get_moments(self, species=None) -> PhaseSpaceMoments:
+        """
+        Returns the moments of a species, given by name of particle_dict or by PDGid, or of every track if None
+        """
+        if species is None:
+            key = ALL
+        else:
+            key = particle_dict.get(species, species)
+        return self.moments.get(key, PhaseSpaceMoments())
+
+    def covariance(self, species=None) -> pd.DataFrame:
+        """
+        Returns the weighted covariance matrix of the VARIABLES of a species, labelled
+        """
+        return pd.DataFrame(self.get_moments(species).covariance(), index=VARIABLES, columns=VARIABLES)
+
+    def emittance(self, species=None, plane: str = "x") -> float:
+        """
+        Returns the geometric RMS emittance of a species in a plane, in mm mrad
+        """
+        return self.get_moments(species).emittance(plane)
+
+    def normalized_emittance(self, species, plane: str = "x") -> float:
+        """
+        Returns the normalized RMS emittance of a species in a plane, in mm
+        """
+        pid = particle_dict.get(species, species)
+        return self.get_moments(pid).normalized_emittance(particle_mass.get(pid, np.nan), plane)
+
+    def twiss(self, species=None, plane: str = "x") -> Dict[str, float]:
+        """
+        Returns the Twiss alpha, beta and gamma of a species in a plane
+        """
+        return self.get_moments(species).twiss(plane)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Returns one row per species (and one for the whole beam) with its number of tracks, its total weight,
+        its mean momentum, and the emittances and Twiss parameters of both planes
+        """
+        records = []
+        names = {pid: name for name, pid in particle_dict.items()}
+        for key, moments in self.moments.items():
+            record = {
+                "species": names.get(key, key),
+                "count": moments.count,
+                "weight": moments.weight,
+                "mean_P": moments.mean[_index["P"]] if moments.weight else np.nan,
+            }
+            for plane in ("x", "y"):
+                record[f"emittance_{plane}"] = moments.emittance(plane)
+                mass = particle_mass.get(key, np.nan) if key != ALL else np.nan
+                record[f"normalized_emittance_{plane}"] = moments.normalized_emittance(mass, plane)
+                for name, value in moments.twiss(plane).items():
+                    record[f"{name}_{plane}"] = value
+            records.append(record)
+        return pd.DataFrame.from_records(records)
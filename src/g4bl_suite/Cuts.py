@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+import operator
+from typing import Callable, Dict
+
+import numpy as np
+
+from g4bl_suite.DataAnalyzer import CHUNK_ROWS, DataAnalyzer
+from g4bl_suite.GlobalVariables import feature_dict, feature_list, particle_dict, particle_mass
+
+# Number of rows evaluated at once: the temporaries of a block stay in the CPU cache
+BLOCK_ROWS = 1 << 15
+
+
+def _mass(pdg: np.ndarray) -> np.ndarray:
+    """
+    Returns the rest mass of every row from its PDGid, NaN for the unknown particles
+    """
+    ids, codes = np.unique(pdg.astype(np.int64), return_inverse=True)
+    return np.array([particle_mass.get(int(pid), np.nan) for pid in ids])[codes]
+
+
+def _momentum(block) -> np.ndarray:
+    return np.sqrt(block["Px"] ** 2 + block["Py"] ** 2 + block["Pz"] ** 2)
+
+
+def _kinetic_energy(block) -> np.ndarray:
+    mass = _mass(block["PDGid"])
+    return np.sqrt(block["momentum"] ** 2 + mass**2) - mass
+
+
+# Quantities computed from the columns of feature_list, in the units of DataAnalyzer
+derived_columns: Dict[str, Callable] = {
+    "x_angle": lambda block: block["Px"] / block["Pz"] * 1000,
+    "y_angle": lambda block: block["Py"] / block["Pz"] * 1000,
+    "radius": lambda block: np.sqrt(block["x"] ** 2 + block["y"] ** 2),
+    "momentum": _momentum,
+    "kinetic_energy": _kinetic_energy,
+}
+
+
+class Expression:
+    """A quantity of every track, built from Column() with the arithmetic operators.
+    Comparing it makes a Cut, e.g. Column("radius") < 10
+    """
+
+    def evaluate(self, block) -> np.ndarray:
+        raise NotImplementedError
+
+    def _combine(self, other, op, reverse=False) -> Expression:
+        other = other if isinstance(other, Expression) else Constant(other)
+        return BinaryExpression(op, other, self) if reverse else BinaryExpression(op, self, other)
+
+    def __add__(self, other):
+        return self._combine(other, np.add)
+
+    def __radd__(self, other):
+        return self._combine(other, np.add, True)
+
+    def __sub__(self, other):
+        return self._combine(other, np.subtract)
+
+    def __rsub__(self, other):
+        return self._combine(other, np.subtract, True)
+
+    def __mul__(self, other):
+        return self._combine(other, np.multiply)
+
+    def __rmul__(self, other):
+        return self._combine(other, np.multiply, True)
+
+    def __truediv__(self, other):
+        return self._combine(other, np.divide)
+
+    def __rtruediv__(self, other):
+        return self._combine(other, np.divide, True)
+
+    def __pow__(self, other):
+        return self._combine(other, np.power)
+
+    def __neg__(self):
+        return UnaryExpression(np.negative, self)
+
+    def __abs__(self):
+        return UnaryExpression(np.abs, self)
+
+    def _compare(self, other, op) -> Cut:
+        return Comparison(op, self, other if isinstance(other, Expression) else Constant(other))
+
+    def __lt__(self, other):
+        return self._compare(other, operator.lt)
+
+    def __le__(self, other):
+        return self._compare(other, operator.le)
+
+    def __gt__(self, other):
+        return self._compare(other, operator.gt)
+
+    def __ge__(self, other):
+        return self._compare(other, operator.ge)
+
+    def __eq__(self, other):
+        return self._compare(other, operator.eq)
+
+    def __ne__(self, other):
+        return self._compare(other, operator.ne)
+
+    __hash__ = object.__hash__
+
+    def between(self, low, high) -> Cut:
+        """
+        Returns the cut low <= self < high
+        """
+        return (self >= low) & (self < high)
+
+    def isin(self, values) -> Cut:
+        """
+        Returns the cut keeping the tracks whose value is one of values
+        """
+        return IsIn(self, values)
+
+
+class Column(Expression):
+    """A column of feature_list or one of the derived_columns: x_angle, y_angle, radius, momentum, kinetic_energy"""
+
+    def __init__(self, name: str):
+        if name not in feature_dict and name not in derived_columns:
+            raise KeyError(f"Unknown column {name}, expected one of {feature_list + list(derived_columns)}")
+        self.name = name
+
+    def evaluate(self, block) -> np.ndarray:
+        return block[self.name]
+
+    def __repr__(self) -> str:
+        return f"Column({self.name!r})"
+
+
+class Constant(Expression):
+    def __init__(self, value):
+        self.value = value
+
+    def evaluate(self, block):
+        return self.value
+
+    def __repr__(self) -> str:
+        return repr(self.value)
+
+
+class UnaryExpression(Expression):
+    def __init__(self, op, operand: Expression):
+        self.op = op
+        self.operand = operand
+
+    def evaluate(self, block) -> np.ndarray:
+        return self.op(self.operand.evaluate(block))
+
+
+class BinaryExpression(Expression):
+    def __init__(self, op, left: Expression, right: Expression):
+        self.op = op
+        self.left = left
+        self.right = right
+
+    def evaluate(self, block) -> np.ndarray:
+        return self.op(self.left.evaluate(block), self.right.evaluate(block))
+
+
+class Cut:
+    """A selection of tracks, combined with & (and), | (or) and ~ (not)
+
+    Examples:
+    >>> data = np.zeros((3, 12))
+    >>> data[:, feature_dict["x"]] = [0, 3, 30]
+    >>> data[:, feature_dict["PDGid"]] = [13, -211, 13]
+    >>> cut = (Column("radius") < 10) & species("mu-")
+    >>> cut.mask(data).tolist()
+    [True, False, False]
+    >>> (~cut).count(data)
+    2
+
+    mask(), count() and apply() evaluate the cut block by block and keep nothing between calls.
+    To apply several cuts to the same data, use a Selection, which keeps the derived columns
+    """
+
+    def evaluate(self, block) -> np.ndarray:
+        raise NotImplementedError
+
+    def __and__(self, other: Cut) -> Cut:
+        return And(self, other)
+
+    def __or__(self, other: Cut) -> Cut:
+        return Or(self, other)
+
+    def __invert__(self) -> Cut:
+        return Not(self)
+
+    def mask(self, data, block_rows: int = BLOCK_ROWS) -> np.ndarray:
+        """
+        Returns the boolean mask of the rows of data (a 2D array or a CompactData) that pass the cut
+        """
+        return Selection(data, block_rows, cache_derived=False).mask(self)
+
+    def count(self, data, block_rows: int = BLOCK_ROWS) -> int:
+        """
+        Returns the number of rows of data that pass the cut
+        """
+        return int(np.count_nonzero(self.mask(data, block_rows)))
+
+    def apply(self, data, block_rows: int = BLOCK_ROWS):
+        """
+        Returns the rows of data that pass the cut
+        """
+        return Selection(data, block_rows, cache_derived=False).select(self)
+
+    def apply_file(self, file_name: str, rows: int = CHUNK_ROWS) -> np.ndarray:
+        """
+        Returns the rows of a detector file that pass the cut, streamed with DataAnalyzer.iter_chunks()
+        so only the selected rows are held in memory
+        """
+        parts = [self.apply(chunk) for chunk in DataAnalyzer.iter_chunks(file_name, rows)]
+        if not parts:
+            return np.empty((0, len(feature_list)))
+        return np.concatenate(parts)
+
+
+class Comparison(Cut):
+    def __init__(self, op, left: Expression, right: Expression):
+        self.op = op
+        self.left = left
+        self.right = right
+
+    def evaluate(self, block) -> np.ndarray:
+        return self.op(self.left.evaluate(block), self.right.evaluate(block))
+
+
+class IsIn(Cut):
+    def __init__(self, expression: Expression, values):
+        self.expression = expression
+        self.values = np.asarray(list(values))
+
+    def evaluate(self, block) -> np.ndarray:
+        values = self.expression.evaluate(block)
+        if self.values.size == 1:
+            return values == self.values[0]
+        return np.isin(values, self.values)
+
+
+class And(Cut):
+    def __init__(self, left: Cut, right: Cut):
+        self.left = left
+        self.right = right
+
+    def evaluate(self, block) -> np.ndarray:
+        mask = self.left.evaluate(block)
+        if not mask.any():
+            return mask
+        return mask & self.right.evaluate(block)
+
+
+class Or(Cut):
+    def __init__(self, left: Cut, right: Cut):
+        self.left = left
+        self.right = right
+
+    def evaluate(self, block) -> np.ndarray:
+        mask = self.left.evaluate(block)
+        if mask.all():
+            return mask
+        return mask | self.right.evaluate(block)
+
+
+class Not(Cut):
+    def __init__(self, cut: Cut):
+        self.cut = cut
+
+    def evaluate(self, block) -> np.ndarray:
+        return ~self.cut.evaluate(block)
+
+
+def species(*names) -> Cut:
+    """
+    Returns the cut keeping some species, given by name of particle_dict or by PDGid
+    """
+    return Column("PDGid").isin([particle_dict.get(name, name) for name in names])
+
+
+class _Block:
+    """The columns of a block of rows of a Selection, looked up by name"""
+
+    def __init__(self, selection: Selection, start: int, stop: int):
+        self.selection = selection
+        self.start = start
+        self.stop = stop
+        self.columns: Dict[str, np.ndarray] = {}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        column = self.columns.get(name)
+        if column is None:
+            if name in feature_dict:
+                column = np.asarray(self.selection.data[self.start: self.stop, feature_dict[name]], dtype=np.float64)
+            elif self.selection.cache_derived:
+                column = self.selection.derived(name)[self.start: self.stop]
+            else:
+                column = derived_columns[name](self)
+            self.columns[name] = column
+        return column
+
+
+class Selection:
+    """Applies cuts to the same detector data again and again
+
+    Cuts are evaluated BLOCK_ROWS rows at a time, so the intermediate results of a cut are the size of a block
+    instead of the size of the data. The derived_columns a cut needs are computed once, block by block,
+    and kept at full size (8 bytes per row each) for the next cuts. The data must not change in the meantime.
+
+    Args:
+        data:
+            2D array or CompactData, in the layout of DataAnalyzer.get_data()
+        block_rows:
+            int, number of rows evaluated at once
+        cache_derived:
+            bool, if False the derived columns are computed again for every block of every cut,
+            so nothing the size of the data is kept, which is what the methods of Cut do
+    """
+
+    def __init__(self, data, block_rows: int = BLOCK_ROWS, cache_derived: bool = True):
+        self.data = data
+        self.block_rows = block_rows
+        self.cache_derived = cache_derived
+        self.derived_cache: Dict[str, np.ndarray] = {}
+
+    def derived(self, name: str) -> np.ndarray:
+        """
+        Returns a derived column over all the rows, computed on first use
+        """
+        column = self.derived_cache.get(name)
+        if column is None:
+            rows = len(self.data)
+            column = np.empty(rows)
+            for start in range(0, rows, self.block_rows):
+                stop = min(start + self.block_rows, rows)
+                column[start:stop] = derived_columns[name](_Block(self, start, stop))
+            self.derived_cache[name] = column
+        return column
+
+    def mask(self, cut: Cut) -> np.ndarray:
+        """
+        Returns the boolean mask of the rows that pass the cut
+        """
+        rows = len(self.data)
+        mask = np.empty(rows, dtype=bool)
+        for start in range(0, rows, self.block_rows):
+            stop = min(start + self.block_rows, rows)
+            mask[start:stop] = cut.evaluate(_Block(self, start, stop))
+        return mask
+
+    def count(self, cut: Cut) -> int:
+        return int(np.count_nonzero(self.mask(cut)))
+
+    def select(self, cut: Cut):
+        """
+        Returns the rows that pass the cut
+        """
+        mask = self.mask(cut)
+        if isinstance(self.data, np.ndarray):
+            # copies the rows in one go, faster than boolean indexing of a 2D array
+            return self.data.compress(mask, axis=0)
+        return self.data[mask]
@@ -14,4 +14,24 @@ feature_list = [
 ]
 feature_dict = {key: value for (value, key) in enumerate(feature_list)}
 
+# Features that G4Beamline writes as integers
+integer_features = ["PDGid", "EventID", "TrackID", "ParentID"]
+
 particle_dict = {"pi-": -211, "mu-": 13, "mu+": -13}
+
+# Rest masses in MeV/c^2 by PDGid, for normalized emittances and kinetic energies
+particle_mass = {
+    11: 0.51099895,
+    -11: 0.51099895,
+    13: 105.6583755,
+    -13: 105.6583755,
+    211: 139.57039,
+    -211: 139.57039,
+    111: 134.9768,
+    321: 493.677,
+    -321: 493.677,
+    2212: 938.27208816,
+    -2212: 938.27208816,
+    2112: 939.56542052,
+    22: 0.0,
+}
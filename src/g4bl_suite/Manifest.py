@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class RunManifest:
+    """A SQLite database of the G4Beamline runs made by Automator.automate()
+
+    Every task is identified by a content hash of its command, of the contents of the .g4bl script
+    and of its 'key=value' parameters, see task_key().
+    Editing the script therefore gives every task a new key, and the old results are not reused by mistake.
+    Deciding what is left to run is one query plus one listing per output directory,
+    instead of one os.path.exists() per output file.
+    """
+
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.connection = sqlite3.connect(file_name)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "key TEXT PRIMARY KEY, "
+            "status TEXT NOT NULL, "
+            "args TEXT NOT NULL, "
+            "outputs TEXT, "
+            "updated REAL NOT NULL, "
+            "runtime REAL)"
+        )
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(runs)")]
+        if "runtime" not in columns:
+            # manifests written before runtimes were recorded
+            self.connection.execute("ALTER TABLE runs ADD COLUMN runtime REAL")
+        self.connection.commit()
+
+    def __enter__(self) -> RunManifest:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def hash_file(file_name: str) -> str:
+        """
+        Returns the sha256 hex digest of the contents of a file, usually the .g4bl script
+        """
+        digest = hashlib.sha256()
+        with open(file_name, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def task_key(args: List[str], script_digest: str) -> str:
+        """
+        Returns the content hash of a task
+
+        Args:
+            args:
+                the argument list of the task, as generated by Automator.generate_args()
+            script_digest:
+                the hash_file() of the .g4bl script
+
+        Returns:
+            A sha256 hex digest of the command, the script contents and the 'key=value' parameters.
+            The number of MPI processes of g4blmpi is left out since it does not change the results.
+
+        Examples:
+        >>> RunManifest.task_key(["g4bl", "a.g4bl", "x=1"], "0") == RunManifest.task_key(["g4bl", "b.g4bl", "x=1"], "0")
+        True
+        >>> RunManifest.task_key(["g4bl", "a.g4bl", "x=1"], "0") == RunManifest.task_key(["g4bl", "a.g4bl", "x=1"], "1")
+        False
+        """
+        content = json.dumps({"cmd": args[0], "script": script_digest, "params": RunManifest.task_params(args)})
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    @staticmethod
+    def task_params(args: List[str]) -> Tuple[str, ...]:
+        """
+        Returns the 'key=value' parameters of the argument list of a task
+
+        Examples:
+        >>> RunManifest.task_params(["g4blmpi", "4", "a.g4bl", "x=1", "y=2"])
+        ('x=1', 'y=2')
+        """
+        return tuple(item for item in args[1:] if 0 < item.find("=") < len(item) - 1)
+
+    def completed_keys(self, check_outputs: bool = False) -> Set[str]:
+        """
+        Returns the keys of every task that finished successfully
+
+        Args:
+            check_outputs:
+                bool, if True a task is only counted when all the output files recorded for it still exist,
+                so that deleting a detector file runs its task again.
+                Every directory of the outputs is listed once, rather than checking the files one by one
+        """
+        rows = self.connection.execute("SELECT key, outputs FROM runs WHERE status = ?", (self.DONE,))
+        if not check_outputs:
+            return {key for key, _ in rows}
+
+        listings = {}
+
+        def exists(file: str) -> bool:
+            directory = os.path.dirname(file) or "."
+            if directory not in listings:
+                try:
+                    listings[directory] = set(os.listdir(directory))
+                except (FileNotFoundError, NotADirectoryError):
+                    listings[directory] = set()
+            return os.path.basename(file) in listings[directory]
+
+        return {key for key, outputs in rows if outputs is None or all(map(exists, json.loads(outputs)))}
+
+    def status(self, key: str):
+        """
+        Returns the status of a task, or None if it never ran
+        """
+        row = self.connection.execute("SELECT status FROM runs WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def outputs(self, key: str) -> List[str]:
+        """
+        Returns the output files recorded for a task
+        """
+        row = self.connection.execute("SELECT outputs FROM runs WHERE key = ?", (key,)).fetchone()
+        return [] if row is None or row[0] is None else json.loads(row[0])
+
+    def runtimes(self) -> Dict[Tuple[str, ...], float]:
+        """
+        Returns the latest wall time in seconds of every parameter set that finished successfully.
+        They are keyed by task_params() rather than by task_key(),
+        so that the history still estimates the cost of tasks after the script is edited.
+        """
+        rows = self.connection.execute(
+            "SELECT args, runtime FROM runs WHERE status = ? AND runtime IS NOT NULL ORDER BY updated",
+            (self.DONE,),
+        )
+        return {self.task_params(json.loads(args)): runtime for args, runtime in rows}
+
+    def record(
+        self, key: str, args: List[str], status: str, outputs: Optional[List[str]] = None, runtime: Optional[float] = None
+    ):
+        """
+        Inserts or updates the entry of a task
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO runs (key, status, args, outputs, updated, runtime) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                status,
+                json.dumps(args),
+                None if outputs is None else json.dumps(outputs),
+                time.time(),
+                runtime,
+            ),
+        )
+        self.connection.commit()
@@ -0,0 +1,532 @@
+from __future__ import annotations
+
+import json
+import multiprocessing as mp
+import os
+import warnings
+import zipfile
+from multiprocessing.pool import ThreadPool
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import tqdm
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+from g4bl_suite.Automator import Automator
+from g4bl_suite.DataAnalyzer import (
+    CHUNK_ROWS,
+    DataAnalyzer,
+    Histogram,
+    ParticleGroups,
+    _merge_moments,
+    _moments,
+    density_grid,
+    density_plot,
+    hist_plot,
+    save_figure,
+)
+from g4bl_suite.GlobalVariables import feature_dict, particle_dict
+
+
+def _load_entry(entry):
+    """
+    Helper function for ScanAnalyzer.load_all(), loads one file of the scan in a worker
+    """
+    key, file_name, analyzer_kwargs = entry
+    return key, DataAnalyzer(file_name, **analyzer_kwargs)
+
+
+def summarize_file(file_name: str, rows: int = CHUNK_ROWS) -> dict:
+    """Computes the summary statistics of one detector file, streaming it with DataAnalyzer.iter_chunks()
+
+    Returns:
+        A dictionary with the number of tracks, the count of every particle of particle_dict,
+        and the mean and standard deviation of the x angle, the y angle and the total momentum
+    """
+    tracks = 0
+    counts = {name: 0 for name in particle_dict}
+    empty = _moments(np.empty(0))
+    moments = {"x_angle": empty, "y_angle": empty, "momentum": empty}
+
+    for chunk in DataAnalyzer.iter_chunks(file_name, rows):
+        tracks += chunk.shape[0]
+        for name, count in ParticleGroups(chunk).get_counts().items():
+            counts[name] += count
+        momentum = np.sqrt(
+            chunk[:, feature_dict["Px"]] ** 2 + chunk[:, feature_dict["Py"]] ** 2 + chunk[:, feature_dict["Pz"]] ** 2
+        )
+        moments["x_angle"] = _merge_moments(moments["x_angle"], _moments(DataAnalyzer.get_x_angle(chunk)))
+        moments["y_angle"] = _merge_moments(moments["y_angle"], _moments(DataAnalyzer.get_y_angle(chunk)))
+        moments["momentum"] = _merge_moments(moments["momentum"], _moments(momentum))
+
+    summary: Dict[str, float] = {"tracks": tracks}
+    summary.update({f"{name}_count": count for name, count in counts.items()})
+    for name, (count, mean, m2, _, _) in moments.items():
+        summary[f"{name}_mean"] = float(mean) if count else np.nan
+        summary[f"{name}_std"] = float(np.sqrt(m2 / count)) if count else np.nan
+    return summary
+
+
+def _summarize_entry(entry):
+    """
+    Helper function for ScanAnalyzer.summarize(), summarizes one file of the scan in a worker
+    """
+    key, file_name, rows = entry
+    return key, summarize_file(file_name, rows)
+
+
+def _panel_values(data, name: str) -> np.ndarray:
+    """
+    Returns a column of feature_list, or the derived x_angle or y_angle, of detector data
+    """
+    if name == "x_angle":
+        return DataAnalyzer.get_x_angle(data)
+    if name == "y_angle":
+        return DataAnalyzer.get_y_angle(data)
+    return np.asarray(data[:, feature_dict[name]])
+
+
+def compute_plot_data(file_name: str, panels: List[dict]) -> dict:
+    """Computes the binned data of every panel of a figure out of one detector file, read once
+
+    A panel is a dictionary with a "kind" and its options:
+        {"kind": "density", "x": "x", "y": "x_angle", "bins": 256, "log_scale": False, "weighted": False}
+        {"kind": "hist", "x": "Pz", "bins": 50, "weighted": False}
+    and optionally a "species" of particle_dict to only plot that particle.
+    x and y are names of feature_list, or "x_angle" and "y_angle".
+
+    Returns:
+        A dictionary of arrays, the grids of the density panels and Histogram.to_arrays() of the others
+    """
+    data = DataAnalyzer(file_name).get_data()
+    groups = ParticleGroups(data)
+    arrays = {}
+    for i, panel in enumerate(panels):
+        panel_data = data if panel.get("species") is None else groups.extract(panel["species"])
+        weights = panel_data[:, feature_dict["Weight"]] if panel.get("weighted") else None
+        if panel["kind"] == "density":
+            grid, x_edges, y_edges = density_grid(
+                _panel_values(panel_data, panel["x"]), _panel_values(panel_data, panel["y"]),
+                panel.get("bins", 256), weights, panel.get("range"),
+            )
+            arrays.update({f"{i}_grid": grid, f"{i}_x_edges": x_edges, f"{i}_y_edges": y_edges})
+        elif panel["kind"] == "hist":
+            values = _panel_values(panel_data, panel["x"])
+            bins = panel.get("bins", 50)
+            if panel.get("range") is None:
+                histogram = Histogram.from_data(values, bins, weights)
+            else:
+                low, high = panel["range"]
+                histogram = Histogram(low, high, bins).fill(values, weights)
+            arrays.update(histogram.to_arrays(f"{i}_"))
+        else:
+            raise ValueError(f"Unknown kind of panel {panel['kind']}, expected density or hist")
+    return arrays
+
+
+def render_figure(title: str, panels: List[dict], arrays: dict, columns: int = 2):
+    """
+    Draws the panels of compute_plot_data() on a new figure and returns it.
+    The figure is not managed by pyplot, so drawing it neither needs nor changes the backend of the caller,
+    and it is freed as soon as it is not referenced anymore
+    """
+    rows = -(-len(panels) // columns)
+    fig = Figure(layout="constrained")
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(rows, columns, squeeze=False)
+    for i, panel in enumerate(panels):
+        ax = axes.flat[i]
+        label = panel["x"] if panel.get("species") is None else f"{panel['species']} {panel['x']}"
+        if panel["kind"] == "density":
+            density_plot(
+                ax, arrays[f"{i}_grid"], arrays[f"{i}_x_edges"], arrays[f"{i}_y_edges"], panel.get("log_scale", False),
+                "Weight per bin" if panel.get("weighted") else "Number of points per bin",
+            )
+            ax.set_xlabel(label)
+            ax.set_ylabel(panel["y"])
+        else:
+            hist_plot(ax, Histogram.from_arrays(arrays, f"{i}_"), label)
+    for ax in axes.flat[len(panels):]:
+        ax.set_visible(False)
+    fig.suptitle(title)
+    return fig
+
+
+def _source_key(file_name: str, **extra) -> dict:
+    stat = os.stat(file_name)
+    key = {"source": os.path.abspath(file_name), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    key.update(extra)
+    # through JSON so that tuples and lists compare equal once reloaded
+    return json.loads(json.dumps(key))
+
+
+def _read_key(key_file: str):
+    try:
+        with open(key_file, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_key(key_file: str, key: dict):
+    with open(key_file + ".tmp", "w") as f:
+        json.dump(key, f)
+    os.replace(key_file + ".tmp", key_file)
+
+
+def load_plot_data(file_name: str, panels: List[dict], cache_file: str) -> dict:
+    """
+    Same as compute_plot_data(), through a .npz cache_file that is reused while the detector file
+    and the panels are unchanged
+    """
+    key = _source_key(file_name, panels=panels)
+    if _read_key(cache_file + ".json") == key:
+        with np.load(cache_file) as f:
+            return {name: f[name] for name in f.files}
+    arrays = compute_plot_data(file_name, panels)
+    with open(cache_file + ".tmp", "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(cache_file + ".tmp", cache_file)
+    _write_key(cache_file + ".json", key)
+    return arrays
+
+
+def _render_entry(entry):
+    """
+    Helper function for ScanAnalyzer.render_figures(), renders the figure of one file in a worker
+    """
+    key, file_name, title, figure_file, cache_file, panels, columns, size, dpi = entry
+    figure_key = _source_key(file_name, panels=panels, columns=columns, size=size, dpi=dpi)
+    if os.path.exists(figure_file) and _read_key(figure_file + ".json") == figure_key:
+        return key, False
+
+    fig = render_figure(title, panels, load_plot_data(file_name, panels, cache_file), columns)
+    save_figure(fig, figure_file, dpi, size)
+    _write_key(figure_file + ".json", figure_key)
+    return key, True
+
+
+class ScanAnalyzer:
+    """Analyzes the output files of a whole parameter scan made by Automator.automate()
+
+    The scan is described the same way as for the Automator: a parameter dictionary,
+    the postfixes of the detectors and the directory the detector files were written to.
+    """
+
+    def __init__(self):
+        self.params_dict = None
+        self.data_directory = None
+        self.detector_lst = None
+        self.param_names = None
+
+    def set_params_dict(self, params_dict) -> ScanAnalyzer:
+        self.params_dict = params_dict
+        return self
+
+    def set_data_directory(self, data_directory) -> ScanAnalyzer:
+        self.data_directory = data_directory
+        return self
+
+    def set_detector_lst(self, detector_lst) -> ScanAnalyzer:
+        self.detector_lst = detector_lst
+        return self
+
+    def get_file_index(self) -> Dict[Tuple[str, ...], str]:
+        """
+        Maps every (parameter values..., detector) tuple of the scan to the path of its output file.
+        The file names are the ones Automator.construct_list_files() expects.
+
+        Returns:
+            A dictionary from tuples of strings to file paths,
+            e.g. ("100", "1", "detector1") -> "data/_meanMomentum100|angle1|detector1.txt"
+        """
+        if (self.params_dict is None) or (self.data_directory is None):
+            raise ValueError("params_dict and data_directory must be set before reading a scan")
+
+        automator = Automator()
+        param_args = automator.generate_param_args(self.params_dict)
+        task_files = automator.construct_list_files(param_args, self.detector_lst)
+
+        self.param_names = [arg.split("=", 1)[0] for arg in param_args[0]] if param_args else []
+        index = {}
+        for args, files in zip(param_args, task_files):
+            values = tuple(arg.split("=", 1)[1] for arg in args)
+            detectors = [None] if self.detector_lst is None else self.detector_lst
+            for detector, file in zip(detectors, files):
+                key = values if detector is None else values + (detector,)
+                index[key] = os.path.join(self.data_directory, file)
+        return index
+
+    def get_existing_file_index(self) -> Dict[Tuple[str, ...], str]:
+        """
+        Same as get_file_index(), without the files that are not in data_directory (yet)
+        """
+        index = self.get_file_index()
+        existing = set(os.listdir(self.data_directory))
+        present = {key: path for key, path in index.items() if os.path.basename(path) in existing}
+        if len(present) != len(index):
+            print(f"{len(index) - len(present)} of {len(index)} files of the scan are missing in {self.data_directory}")
+        return present
+
+    def load_all(
+        self, process_count: Optional[int] = None, use_threads: bool = False, **analyzer_kwargs
+    ) -> Dict[Tuple[str, ...], DataAnalyzer]:
+        """
+        Loads every existing file of the scan concurrently
+
+        Args:
+            process_count:
+                int, number of workers, defaults to the number of cores
+            use_threads:
+                bool, use a pool of threads instead of processes, defaults to False.
+                Threads avoid copying the arrays back from the workers,
+                which is worth it with cache=True since memory maps are then shared for free
+            analyzer_kwargs:
+                keyword arguments for every DataAnalyzer, e.g. cache=True or columns=[...]
+
+        Returns:
+            A dictionary from (parameter values..., detector) tuples to DataAnalyzer objects
+        """
+        index = self.get_existing_file_index()
+        entries = [(key, file_name, analyzer_kwargs) for key, file_name in index.items()]
+        if process_count is None:
+            process_count = os.cpu_count() or 1
+
+        pool = ThreadPool if use_threads else mp.Pool
+        result = {}
+        with pool(max(1, min(process_count, len(entries)))) as p:
+            for key, analyzer in tqdm.tqdm(
+                p.imap_unordered(_load_entry, entries),
+                total=len(entries),
+                colour="#F8C8DC",
+                desc="Loading scan",
+            ):
+                result[key] = analyzer
+
+        # keep the order of the scan rather than the order of completion
+        return {key: result[key] for key in index}
+
+    def summarize(
+        self, process_count: Optional[int] = None, rows: int = CHUNK_ROWS, store_file: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        Walks every existing file of the scan once, in parallel, and gathers their summarize_file() statistics
+
+        With a store_file, the summary is incremental: the table saved by the previous call is loaded,
+        only the files that are new or whose size or modification time changed since are read again,
+        and the merged table is saved back to store_file.
+
+        Args:
+            process_count:
+                int, number of worker processes, defaults to the number of cores
+            rows:
+                int, number of rows each worker reads at once, bounds the memory of the workers
+            store_file:
+                str, optional .npz or .parquet file that keeps the summary between calls, see save_summary()
+
+        Returns:
+            A pandas DataFrame with one row per (parameter combination, detector):
+            one column per parameter, a "detector" column, the "file_name", "file_size" and "file_mtime_ns"
+            of the source, then the columns of summarize_file()
+        """
+        index = self.get_existing_file_index()
+        stats = {}
+        with os.scandir(self.data_directory) as directory_entries:
+            for entry in directory_entries:
+                stat = entry.stat()
+                stats[entry.name] = {"file_size": stat.st_size, "file_mtime_ns": stat.st_mtime_ns}
+
+        stored = {}
+        if store_file is not None and os.path.exists(store_file):
+            try:
+                frame = self.load_summary(store_file)
+            except (OSError, ValueError, EOFError, zipfile.BadZipFile) as error:
+                # e.g. written by a version that did not save atomically, every file is read again
+                warnings.warn(f"Could not load the summary store {store_file}, it is rebuilt: {error}")
+                frame = pd.DataFrame(columns=["file_name"])
+            for row in frame.to_dict("records"):
+                stored[row["file_name"]] = row
+
+        summaries = {}
+        entries = []
+        for key, file_name in index.items():
+            name = os.path.basename(file_name)
+            row = stored.get(name)
+            if (
+                row is not None
+                and row["file_size"] == stats[name]["file_size"]
+                and row["file_mtime_ns"] == stats[name]["file_mtime_ns"]
+            ):
+                key_columns = self._key_columns()
+                summaries[key] = {column: value for column, value in row.items() if column not in key_columns}
+                summaries[key].update(stats[name])
+            else:
+                entries.append((key, file_name, rows))
+
+        if entries:
+            if process_count is None:
+                process_count = os.cpu_count() or 1
+            with mp.Pool(max(1, min(process_count, len(entries)))) as p:
+                for key, summary in tqdm.tqdm(
+                    p.imap_unordered(_summarize_entry, entries),
+                    total=len(entries),
+                    colour="#F8C8DC",
+                    desc="Summarizing scan",
+                ):
+                    summary.update(stats[os.path.basename(index[key])])
+                    summaries[key] = summary
+
+        frame = self._to_frame([(key, index[key], summaries[key]) for key in index])
+        if store_file is not None:
+            self.save_summary(frame, store_file)
+        return frame
+
+    def render_figures(
+        self,
+        panels: List[dict],
+        output_directory: str,
+        process_count: Optional[int] = None,
+        pdf_file: Optional[str] = None,
+        file_format: str = "pdf",
+        columns: int = 2,
+        size=(11, 8.5),
+        dpi: int = 150,
+        cache_dir: Optional[str] = None,
+    ) -> Dict[Tuple[str, ...], str]:
+        """
+        Renders one figure per existing file of the scan, in parallel, with the Agg backend
+
+        The binned data of every figure (see compute_plot_data()) is cached in cache_dir,
+        and a figure whose detector file and options did not change since it was last rendered is skipped,
+        so rerunning after a few more files came in only renders those.
+
+        Args:
+            panels:
+                the plot spec, a list of panel dictionaries, see compute_plot_data()
+            output_directory:
+                str, directory of the figures, named after the detector files
+            process_count:
+                int, number of worker processes, defaults to the number of cores
+            pdf_file:
+                str, optional path of a multi-page PDF of every figure, in the order of the scan.
+                It is drawn from the cached data, without reading the detector files again
+            file_format:
+                str, extension of the figures, e.g. "pdf" or "png"
+            columns:
+                int, number of panels per row
+            size:
+                (width, height) of the figures in inches
+            dpi:
+                int, resolution of the images in the figures
+            cache_dir:
+                str, directory of the cached plot data, defaults to .plot-cache in output_directory
+
+        Returns:
+            A dictionary from (parameter values..., detector) tuples to the paths of the figures
+        """
+        index = self.get_existing_file_index()
+        if cache_dir is None:
+            cache_dir = os.path.join(output_directory, ".plot-cache")
+        os.makedirs(output_directory, exist_ok=True)
+        os.makedirs(cache_dir, exist_ok=True)
+        size = list(size)
+
+        entries = []
+        figures = {}
+        for key, file_name in index.items():
+            stem = os.path.splitext(os.path.basename(file_name))[0]
+            title = ", ".join(f"{name}={value}" for name, value in zip(self.param_names, key))
+            if self.detector_lst is not None:
+                title += f", {key[-1]}"
+            figures[key] = os.path.join(output_directory, f"{stem}.{file_format}")
+            cache_file = os.path.join(cache_dir, f"{stem}.npz")
+            entries.append((key, file_name, title, figures[key], cache_file, panels, columns, size, dpi))
+
+        rendered = 0
+        if entries:
+            if process_count is None:
+                process_count = os.cpu_count() or 1
+            with mp.Pool(max(1, min(process_count, len(entries)))) as p:
+                for _, was_rendered in tqdm.tqdm(
+                    p.imap_unordered(_render_entry, entries),
+                    total=len(entries),
+                    colour="#F8C8DC",
+                    desc="Rendering figures",
+                ):
+                    rendered += was_rendered
+        print(f"Rendered {rendered} figures, {len(entries) - rendered} were up to date")
+
+        if pdf_file is not None:
+            with PdfPages(pdf_file) as pdf:
+                for _, file_name, title, _, cache_file, _, _, _, _ in entries:
+                    fig = render_figure(title, panels, load_plot_data(file_name, panels, cache_file), columns)
+                    fig.set_size_inches(size, forward=False)
+                    pdf.savefig(fig, dpi=dpi)
+        return figures
+
+    def _key_columns(self) -> list:
+        """
+        Returns the columns of the summary table that identify a file rather than summarize it
+        """
+        return list(self.param_names) + ["detector", "file_name", "file_size", "file_mtime_ns"]
+
+    def _to_frame(self, rows: list) -> pd.DataFrame:
+        """
+        Builds the summary table out of (key, file name, summary) tuples
+        """
+        records = []
+        for key, file_name, summary in rows:
+            record = dict(zip(self.param_names, key))
+            if self.detector_lst is not None:
+                record["detector"] = key[-1]
+            record["file_name"] = os.path.basename(file_name)
+            record["file_size"] = summary["file_size"]
+            record["file_mtime_ns"] = summary["file_mtime_ns"]
+            record.update(summary)
+            records.append(record)
+
+        frame = pd.DataFrame.from_records(records)
+        for name in self.param_names:
+            if name in frame:
+                # parameters are strings on the command line, make them numbers when they all are
+                try:
+                    frame[name] = pd.to_numeric(frame[name])
+                except (ValueError, TypeError):
+                    pass
+        return frame
+
+    @staticmethod
+    def save_summary(frame: pd.DataFrame, file_name: str):
+        """
+        Saves a summary table, as Parquet if file_name ends with .parquet (needs pyarrow), as .npz otherwise.
+        It is written to a temporary file first, so that an interrupted save leaves the previous table intact
+        """
+        temporary_file = file_name + ".tmp"
+        try:
+            if file_name.endswith(".parquet"):
+                frame.to_parquet(temporary_file, index=False)
+            else:
+                columns = {}
+                for name in frame.columns:
+                    column = frame[name].to_numpy()
+                    # strings are saved as fixed width unicode so that no pickle is needed to load them
+                    columns[name] = column.astype(str) if column.dtype == object else column
+                with open(temporary_file, "wb") as f:
+                    np.savez(f, **columns)
+            os.replace(temporary_file, file_name)
+        finally:
+            if os.path.exists(temporary_file):
+                os.remove(temporary_file)
+
+    @staticmethod
+    def load_summary(file_name: str) -> pd.DataFrame:
+        """
+        Loads a summary table saved by save_summary()
+        """
+        if file_name.endswith(".parquet"):
+            return pd.read_parquet(file_name)
+        with np.load(file_name) as f:
+            return pd.DataFrame({name: f[name] for name in f.files})
@@ -0,0 +1,126 @@
+import heapq
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def estimate_costs(
+    tasks: Sequence[List[str]],
+    cost_fn: Optional[Callable[[List[str]], float]] = None,
+    history: Optional[Dict[Tuple, float]] = None,
+    key_fn: Optional[Callable[[List[str]], Tuple]] = None,
+) -> List[float]:
+    """Estimates the cost of every task
+
+    Args:
+        tasks:
+            the argument lists of the tasks, as generated by Automator.generate_args()
+        cost_fn:
+            optional function from the argument list of a task to its expected cost, e.g. its nEv times its momentum
+        history:
+            optional dictionary from task keys to the runtimes in seconds measured by previous runs,
+            e.g. RunManifest.runtimes(), keyed by the tuple of the 'key=value' parameters
+        key_fn:
+            function from the argument list of a task to its key in history, e.g. RunManifest.task_params
+
+    Returns:
+        A list of costs, in the order of tasks.
+        cost_fn wins over history. Without either, or for tasks that never ran,
+        the cost is the median of the known runtimes (or 1 when nothing is known).
+
+    Examples:
+    >>> estimate_costs([["g4bl", "f", "nEv=10"], ["g4bl", "f", "nEv=1000"]], cost_fn=lambda args: int(args[2][4:]))
+    [10, 1000]
+    """
+    if cost_fn is not None:
+        return [cost_fn(task) for task in tasks]
+
+    known: Dict[int, float] = {}
+    if history:
+        if key_fn is None:
+            raise ValueError("key_fn is needed to look tasks up in history")
+        for i, task in enumerate(tasks):
+            runtime = history.get(key_fn(task))
+            if runtime is not None:
+                known[i] = runtime
+    default = float(np.median(list(known.values()))) if known else 1.0
+    return [known.get(i, default) for i in range(len(tasks))]
+
+
+def longest_first(costs: Sequence[float]) -> List[int]:
+    """
+    Returns the indices of the tasks sorted by decreasing cost, the order of the LPT (longest processing time) rule
+
+    Examples:
+    >>> longest_first([1, 5, 3])
+    [1, 2, 0]
+    """
+    return sorted(range(len(costs)), key=lambda i: costs[i], reverse=True)
+
+
+def projected_makespan(costs: Sequence[float], worker_count: int) -> float:
+    """
+    Simulates dispatching tasks in the given order to the first free of worker_count workers,
+    which is what a pool does, and returns the time the last one finishes
+
+    Examples:
+    >>> projected_makespan([5, 4, 3, 3, 3], 2)
+    10
+    >>> projected_makespan([3, 3, 3, 4, 5], 2)
+    11
+    """
+    loads: List[float] = [0] * max(1, worker_count)
+    for cost in costs:
+        heapq.heappush(loads, heapq.heappop(loads) + cost)
+    return max(loads)
+
+
+def desired_ranks(costs: Sequence[float], total_cores: int, max_ranks: Optional[int] = None) -> List[int]:
+    """
+    Gives the number of MPI ranks every task would like, from its cost relative to the balanced load of a core
+
+    If the scan were perfectly balanced, every core would work for sum(costs) / total_cores.
+    A task gets the ranks it needs to finish within that time, so the expensive tasks do not become
+    the tail of the scan however many cheap tasks there are. Cheap tasks get a single rank,
+    where MPI only adds overhead.
+
+    Examples:
+    >>> desired_ranks([1, 1, 1, 97], 8)
+    [1, 1, 1, 8]
+    >>> desired_ranks([1, 1, 1, 97], 8, max_ranks=4)
+    [1, 1, 1, 4]
+    >>> desired_ranks([1] * 100 + [100] * 10, 16)[-1]
+    2
+    """
+    cap = total_cores if max_ranks is None else min(max_ranks, total_cores)
+    total = float(sum(costs)) or 1.0
+    # the tolerance keeps a task of exactly n balanced loads at n ranks
+    return [int(min(cap, max(1, math.ceil(total_cores * cost / total - 1e-9)))) for cost in costs]
+
+
+def launch_ranks(desired: int, free_cores: int, remaining: int, running: int, max_ranks: Optional[int] = None) -> int:
+    """
+    Decides how many MPI ranks the next task starts with given the cores free right now, or 0 to wait for more.
+
+    A task starts with fewer ranks than it desired once half of them are free, and with whatever is free
+    when nothing else runs. Once fewer tasks are left than there are free cores,
+    the free cores are shared between them so that the end of a scan does not leave cores idle.
+
+    Examples:
+    >>> launch_ranks(4, free_cores=8, remaining=10, running=1)
+    4
+    >>> launch_ranks(4, free_cores=1, remaining=10, running=3)
+    0
+    >>> launch_ranks(4, free_cores=1, remaining=10, running=0)
+    1
+    >>> launch_ranks(1, free_cores=8, remaining=2, running=0)
+    4
+    """
+    ranks = max(desired, free_cores // max(1, remaining))
+    if max_ranks is not None:
+        ranks = min(ranks, max(desired, max_ranks))
+    ranks = min(ranks, free_cores)
+    if running and ranks < (desired + 1) // 2:
+        return 0
+    return max(ranks, 0)
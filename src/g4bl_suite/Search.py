@@ -0,0 +1,71 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+
+def latin_hypercube(count: int, bounds: Sequence[Tuple[float, float]], rng: np.random.Generator) -> np.ndarray:
+    """Draws a Latin hypercube sample: every parameter range is cut in count strata of the same width
+    and every stratum of every parameter holds exactly one point, which covers the box far better
+    than count random points or a grid with the same number of runs
+
+    Args:
+        count:
+            int, number of points
+        bounds:
+            (low, high) of every parameter
+        rng:
+            numpy random generator
+
+    Returns:
+        An array of shape (count, number of parameters)
+
+    Examples:
+    >>> points = latin_hypercube(4, [(0, 4), (10, 20)], np.random.default_rng(0))
+    >>> np.sort(np.floor(points[:, 0])).tolist()
+    [0.0, 1.0, 2.0, 3.0]
+    """
+    limits = np.asarray(bounds, dtype=np.float64).reshape(-1, 2)
+    strata = rng.permuted(np.tile(np.arange(count), (len(limits), 1)), axis=1).T
+    unit = (strata + rng.random((count, len(limits)))) / count
+    return limits[:, 0] + unit * (limits[:, 1] - limits[:, 0])
+
+
+def shrink_bounds(
+    bounds: Sequence[Tuple[float, float]],
+    center: Sequence[float],
+    factor: float,
+    limits: Sequence[Tuple[float, float]],
+) -> List[Tuple[float, float]]:
+    """
+    Returns the box factor times as wide as bounds, centered on center
+    and shifted back inside limits where it sticks out
+
+    Examples:
+    >>> shrink_bounds([(0, 10)], [4], 0.5, [(0, 10)])
+    [(1.5, 6.5)]
+    >>> shrink_bounds([(0, 10)], [9], 0.5, [(0, 10)])
+    [(5.0, 10.0)]
+    """
+    result = []
+    for (low, high), value, (lower_limit, upper_limit) in zip(bounds, center, limits):
+        half_width = (high - low) * factor / 2
+        low, high = value - half_width, value + half_width
+        if low < lower_limit:
+            low, high = lower_limit, high + lower_limit - low
+        if high > upper_limit:
+            low, high = low - (high - upper_limit), upper_limit
+        result.append((float(max(low, lower_limit)), float(high)))
+    return result
+
+
+def format_value(value: float, integer: bool = False) -> str:
+    """
+    Formats a parameter value for the command line and the names of the output files
+
+    Examples:
+    >>> format_value(1.23456789)
+    '1.23457'
+    >>> format_value(6.7, integer=True)
+    '7'
+    """
+    return str(int(round(value))) if integer else f"{value:.6g}"
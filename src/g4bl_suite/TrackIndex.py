@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+
+from g4bl_suite.GlobalVariables import feature_dict
+
+
+# Above this many keys, find() sorts them before searching
+SORT_QUERIES_ABOVE = 1 << 14
+
+
+def track_keys(event_ids, track_ids) -> np.ndarray:
+    """
+    Packs (EventID, TrackID) pairs into single int64 keys, EventID << 32 | TrackID,
+    which sort by event then by track
+
+    Examples:
+    >>> track_keys(np.array([1.0, 2.0]), np.array([3.0, 1.0])).tolist()
+    [4294967299, 8589934593]
+    """
+    return (np.asarray(event_ids).astype(np.int64) << 32) | np.asarray(track_ids).astype(np.int64)
+
+
+class TrackIndex:
+    """Index of the tracks of detector data by (EventID, TrackID)
+
+    The keys of track_keys() are sorted once with a stable argsort; finding any number of tracks is then
+    one np.searchsorted, in place of a Python loop over the rows for every track.
+    The ParentID column turns it into the lineage of the tracks: parents() finds the row of the parent
+    of every track, in this data or in another TrackIndex (e.g. the pi- at the target of a mu- at
+    a later detector), ancestors() follows the chain up, and join() matches the same tracks between detectors.
+
+    Examples:
+    >>> data = np.zeros((3, 12))
+    >>> data[:, feature_dict["EventID"]] = 1
+    >>> data[:, feature_dict["TrackID"]] = [1, 2, 3]
+    >>> data[:, feature_dict["ParentID"]] = [0, 1, 2]
+    >>> TrackIndex(data).ancestors([2]).tolist()
+    [[1, 0]]
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.keys = track_keys(data[:, feature_dict["EventID"]], data[:, feature_dict["TrackID"]])
+        self.order = np.argsort(self.keys, kind="stable")
+        self.sorted_keys = self.keys[self.order]
+
+    def __len__(self) -> int:
+        return self.keys.size
+
+    def find(self, keys) -> np.ndarray:
+        """
+        Returns the row of every key of track_keys(), -1 for the tracks that are not in the data.
+        A track recorded several times (it crossed the detector more than once) gives its first row
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        if keys.size <= SORT_QUERIES_ABOVE:
+            return self._find_sorted(keys)
+        # the binary searches of sorted queries walk the index in order and stay in the cache,
+        # which more than pays for sorting them
+        order = np.argsort(keys.ravel(), kind="stable")
+        rows = np.empty(keys.size, dtype=np.intp)
+        rows[order] = self._find_sorted(keys.ravel()[order])
+        return rows.reshape(keys.shape)
+
+    def _find_sorted(self, keys: np.ndarray) -> np.ndarray:
+        if self.sorted_keys.size == 0:
+            return np.full(keys.shape, -1, dtype=np.intp)
+        positions = np.minimum(np.searchsorted(self.sorted_keys, keys), self.sorted_keys.size - 1)
+        return np.where(self.sorted_keys[positions] == keys, self.order[positions], -1)
+
+    def find_tracks(self, event_ids, track_ids) -> np.ndarray:
+        """
+        Same as find() with the EventID and TrackID of the tracks
+        """
+        return self.find(track_keys(event_ids, track_ids))
+
+    def _rows(self, rows):
+        return np.arange(self.keys.size) if rows is None else np.asarray(rows, dtype=np.intp)
+
+    def parent_keys(self, rows=None) -> np.ndarray:
+        """
+        Returns the track_keys() of the parents of some rows (all of them by default), -1 for primary tracks
+        """
+        rows = self._rows(rows)
+        parents = np.asarray(self.data[:, feature_dict["ParentID"]])[rows]
+        keys = track_keys(np.asarray(self.data[:, feature_dict["EventID"]])[rows], parents)
+        return np.where(parents > 0, keys, -1)
+
+    def parents(self, rows=None, other: Optional[TrackIndex] = None) -> np.ndarray:
+        """
+        Returns the rows of the parents of some rows (all of them by default), -1 where the parent is not recorded
+
+        Args:
+            rows:
+                optional array of rows of this data
+            other:
+                optional TrackIndex of another detector to look the parents up in, defaults to self
+        """
+        index = self if other is None else other
+        return index.find(self.parent_keys(rows))
+
+    def ancestors(self, rows=None, max_depth: int = 64) -> np.ndarray:
+        """
+        Follows the parents of some rows up their chain, one generation at a time for all the rows at once
+
+        Returns:
+            A 2D array, column k holding the rows of the ancestors k + 1 generations up, -1 past the end of a chain.
+            To follow tracks across detectors, build the index over the rows of all of them
+        """
+        current = self._rows(rows)
+        generations = []
+        for _ in range(max_depth):
+            parents = np.full(current.shape, -1, dtype=np.intp)
+            known = current >= 0
+            parents[known] = self.parents(current[known])
+            if not (parents >= 0).any():
+                break
+            generations.append(parents)
+            current = parents
+        if not generations:
+            return np.empty((current.size, 0), dtype=np.intp)
+        return np.stack(generations, axis=1)
+
+    def contains(self, keys) -> np.ndarray:
+        """
+        Returns a boolean array, True for the track_keys() that are in the data
+        """
+        return self.find(keys) >= 0
+
+    def join(self, other: TrackIndex):
+        """
+        Matches the tracks recorded in both this data and other, e.g. two detectors of the same run
+
+        Returns:
+            (rows in self, rows in other) of the common tracks, in the order of the rows of self
+        """
+        other_rows = other._find_sorted(self.sorted_keys)
+        matched = other_rows >= 0
+        rows = self.order[matched]
+        order = np.argsort(rows, kind="stable")
+        return rows[order], other_rows[matched][order]
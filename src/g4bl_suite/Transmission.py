@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import os
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from g4bl_suite.DataAnalyzer import CHUNK_ROWS, DataAnalyzer, Histogram
+from g4bl_suite.GlobalVariables import feature_dict, feature_list, particle_dict
+from g4bl_suite.TrackIndex import track_keys
+
+
+class Transmission:
+    """Transmission and losses of the tracks of one run through an ordered series of virtual detectors
+
+    Every detector file is streamed once with DataAnalyzer.iter_chunks(), keeping only the track_keys()
+    and the PDGid of its tracks and the mean z of the detector. The tracks of all the detectors then make
+    one sorted table with a column of presence per detector, from which the transmission of every species
+    and the place where tracks are lost come out as vectorized operations.
+    The rows of a detector are only read again, streamed, to extract conditional phase-space subsets.
+
+    Args:
+        detector_files:
+            paths of the detector files of one run, in the order of the beamline
+        names:
+            optional names of the detectors, defaults to the names of the files
+        rows:
+            int, number of rows read at once
+    """
+
+    def __init__(self, detector_files: List[str], names: Optional[List[str]] = None, rows: int = CHUNK_ROWS):
+        self.detector_files = list(detector_files)
+        self.names = list(names) if names is not None else [os.path.basename(file) for file in self.detector_files]
+        self.rows = rows
+
+        keys_per_detector = []
+        species_per_detector = []
+        self.z = np.full(len(self.detector_files), np.nan)
+        for i, file_name in enumerate(self.detector_files):
+            key_chunks, species_chunks, z_sum, z_count = [], [], 0.0, 0
+            for chunk in DataAnalyzer.iter_chunks(file_name, rows):
+                key_chunks.append(track_keys(chunk[:, feature_dict["EventID"]], chunk[:, feature_dict["TrackID"]]))
+                species_chunks.append(chunk[:, feature_dict["PDGid"]].astype(np.int64))
+                z_sum += chunk[:, feature_dict["z"]].sum()
+                z_count += chunk.shape[0]
+            keys = np.concatenate(key_chunks) if key_chunks else np.empty(0, dtype=np.int64)
+            species = np.concatenate(species_chunks) if species_chunks else np.empty(0, dtype=np.int64)
+            # a track that crossed a detector twice counts once
+            unique_keys, first = np.unique(keys, return_index=True)
+            keys_per_detector.append(unique_keys)
+            species_per_detector.append(species[first])
+            if z_count:
+                self.z[i] = z_sum / z_count
+
+        all_keys = np.concatenate(keys_per_detector)
+        all_species = np.concatenate(species_per_detector)
+        self.keys, first = np.unique(all_keys, return_index=True)
+        self.species = all_species[first]
+        self.present = np.zeros((self.keys.size, len(self.detector_files)), dtype=bool)
+        for i, keys in enumerate(keys_per_detector):
+            self.present[np.searchsorted(self.keys, keys), i] = True
+
+    def _tracks(self, species=None) -> np.ndarray:
+        """
+        Returns a boolean mask of the tracks of a species, given by name of particle_dict or by PDGid
+        """
+        if species is None:
+            return np.ones(self.keys.size, dtype=bool)
+        return self.species == particle_dict.get(species, species)
+
+    def transmission(self, species=None, start: int = 0) -> pd.DataFrame:
+        """
+        Counts the tracks of a species that are seen at the detector start and at every later detector
+
+        Returns:
+            A pandas DataFrame with one row per detector from start on: its "detector" name, its mean "z",
+            the "count" of its tracks, the tracks of start that "reach" it, their fraction of start ("transmission")
+            and their fraction of the ones that reached the detector before ("step_transmission")
+        """
+        tracks = self._tracks(species) & self.present[:, start]
+        reach = np.logical_and.accumulate(self.present[tracks, start:], axis=1) if tracks.any() else None
+        records = []
+        initial = int(tracks.sum())
+        previous = initial
+        for offset, i in enumerate(range(start, len(self.detector_files))):
+            reached = int(reach[:, offset].sum()) if reach is not None else 0
+            records.append({
+                "detector": self.names[i],
+                "z": self.z[i],
+                "count": int((self._tracks(species) & self.present[:, i]).sum()),
+                "reach": reached,
+                "transmission": reached / initial if initial else np.nan,
+                "step_transmission": reached / previous if previous else np.nan,
+            })
+            previous = reached
+        return pd.DataFrame.from_records(records)
+
+    def last_detector(self, species=None, start: int = 0) -> np.ndarray:
+        """
+        Returns, for every track of a species seen at the detector start, the index of the last detector it
+        reached without a gap. Tracks with a last detector before the final one were lost after it
+        """
+        tracks = self._tracks(species) & self.present[:, start]
+        reach = np.logical_and.accumulate(self.present[tracks, start:], axis=1)
+        return start + reach.sum(axis=1) - 1
+
+    def losses(self, species=None, start: int = 0) -> pd.DataFrame:
+        """
+        Counts where the tracks of a species seen at the detector start are lost
+
+        Returns:
+            A pandas DataFrame with one row per detector: the tracks "lost_after" it (seen there but not at the
+            next detector) and their fraction of start, the last row counting the tracks that made it to the end
+        """
+        last = self.last_detector(species, start)
+        counts = np.bincount(last - start, minlength=len(self.detector_files) - start)
+        return pd.DataFrame({
+            "detector": self.names[start:],
+            "z": self.z[start:],
+            "lost_after": counts,
+            "fraction": counts / last.size if last.size else np.nan,
+        })
+
+    def loss_histogram(self, species=None, start: int = 0, bins: int = 50) -> Histogram:
+        """
+        Returns a Histogram of the z of the last detector reached by the tracks lost along the beamline
+        """
+        last = self.last_detector(species, start)
+        z = self.z[last[last < len(self.detector_files) - 1]]
+        low, high = np.nanmin(self.z), np.nanmax(self.z)
+        if not high > low:
+            low, high = low - 0.5, high + 0.5
+        return Histogram(low, high, bins).fill(z)
+
+    def subset(
+        self, detector: int, reaching: Optional[int] = None, lost_before: Optional[int] = None, species=None
+    ) -> np.ndarray:
+        """
+        Extracts the rows of a detector for the tracks that reach (or not) another detector,
+        e.g. the phase space at the target of the tracks that make it to the end
+
+        Args:
+            detector:
+                int, index of the detector to extract the rows of
+            reaching:
+                int, optional index of a detector the tracks must reach without a gap
+            lost_before:
+                int, optional index of a detector the tracks must not reach
+            species:
+                optional species, by name of particle_dict or by PDGid
+
+        Returns:
+            A 2D array in the layout of DataAnalyzer.get_data()
+        """
+        tracks = self._tracks(species) & self.present[:, detector]
+        if reaching is not None:
+            tracks &= self.present[:, detector: reaching + 1].all(axis=1)
+        if lost_before is not None:
+            tracks &= ~self.present[:, detector: lost_before + 1].all(axis=1)
+        selected = self.keys[tracks]
+
+        parts = []
+        for chunk in DataAnalyzer.iter_chunks(self.detector_files[detector], self.rows):
+            keys = track_keys(chunk[:, feature_dict["EventID"]], chunk[:, feature_dict["TrackID"]])
+            positions = np.minimum(np.searchsorted(selected, keys), max(selected.size - 1, 0))
+            if selected.size:
+                parts.append(chunk[selected[positions] == keys])
+        if not parts:
+            return np.empty((0, len(feature_list)))
+        return np.concatenate(parts)
@@ -1,3 +1,10 @@
 from g4bl_suite.Automator import Automator
 from g4bl_suite.DataAnalyzer import DataAnalyzer
 from g4bl_suite import GlobalVariables
+from g4bl_suite.ScanAnalyzer import ScanAnalyzer
+from g4bl_suite.Manifest import RunManifest
+from g4bl_suite.BeamStatistics import BeamStatistics
+from g4bl_suite.TrackIndex import TrackIndex
+from g4bl_suite.Transmission import Transmission
+from g4bl_suite import Cuts
+from g4bl_suite.Cuts import Column, Cut, Selection
@@ -0,0 +1,79 @@
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+# A stand-in for g4bl and g4blmpi: it logs how it was called, then writes one ASCII detector file
+# per detector in its working directory, named like Automator.construct_list_files() expects.
+# x and y of every track are the values of the parameters a and b, so tests can build objectives on them.
+FAKE_G4BL = """#!{python}
+import json
+import os
+import sys
+import time
+
+# the event range is not part of the output names, like in a real rename=
+EVENT_RANGE = ("first", "last")
+args = sys.argv[1:]
+mpi_count = None
+if {mpi}:
+    mpi_count = int(args.pop(0))
+params = [arg for arg in args[1:] if "=" in arg]
+values = dict(arg.split("=", 1) for arg in params)
+
+with open({log!r}, "a") as f:
+    f.write(json.dumps({{"script": args[0], "params": params, "mpi_count": mpi_count, "cwd": os.getcwd()}}) + "\\n")
+
+time.sleep(float(values.get("sleep", 0)))
+# an input of the script, relative to the working directory like a field map
+if "input" in values:
+    with open(values["input"]) as f:
+        f.read()
+# an output other than a detector file, like a histogram file
+if "extra" in values:
+    with open(values["extra"], "w") as f:
+        f.write("histograms\\n")
+if int(values.get("exit", 0)) != 0:
+    sys.stderr.write("G4Exception: fake failure\\n")
+    sys.exit(int(values["exit"]))
+
+first = int(values.get("first", 1))
+last = int(values.get("last", values.get("nEv", 5)))
+stem = "|".join(arg.replace("=", "") for arg in params if arg.split("=", 1)[0] not in EVENT_RANGE)
+for detector in {detectors!r}:
+    with open(f"{{stem}}|{{detector}}.txt", "w") as f:
+        f.write("#BLTrackFile2 fake\\n#x y z Px Py Pz t PDGid EventID TrackID ParentID Weight\\n")
+        for event in range(first, last + 1):
+            pid = 13 if event % 2 else -211
+            f.write(f"{{values.get('a', 0)}} {{values.get('b', 0)}} 0 1 2 100 0 {{pid}} {{event}} 1 0 1\\n")
+"""
+
+
+@pytest.fixture
+def fake_g4bl(tmp_path):
+    """
+    Returns a function that writes a fake g4bl (or g4blmpi) executable and returns (its path, its call log path)
+    """
+
+    def make(name="g4bl", detectors=("detector1",)):
+        directory = tmp_path / "bin"
+        directory.mkdir(exist_ok=True)
+        cmd = directory / name
+        log = tmp_path / f"{name}_calls.jsonl"
+        cmd.write_text(
+            FAKE_G4BL.format(python=sys.executable, mpi=name.endswith("mpi"), log=str(log), detectors=list(detectors))
+        )
+        cmd.chmod(cmd.stat().st_mode | stat.S_IXUSR)
+        return str(cmd), str(log)
+
+    return make
+
+
+def read_calls(log):
+    """Returns the calls recorded by a fake g4bl"""
+    if not os.path.exists(log):
+        return []
+    with open(log) as f:
+        return [json.loads(line) for line in f]
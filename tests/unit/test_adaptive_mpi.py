@@ -0,0 +1,35 @@
+import pytest
+from conftest import read_calls
+
+from g4bl_suite import Automator
+
+
+def test_adaptive_mpi_gives_ranks_by_cost(tmp_path, fake_g4bl, monkeypatch):
+    cmd, log = fake_g4bl("g4blmpi")
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    monkeypatch.chdir(tmp_path)
+
+    automator = Automator().set_cmd(cmd).set_file_name(str(script)).set_params_dict({"a": list(range(11))})
+    automator.automate(
+        total_process_count=4,
+        adaptive_mpi=True,
+        cost_fn=lambda args: 30 if args[-1] == "a=10" else 1,
+    )
+
+    # tasks running side by side log in any order, the job id in the name of their directory is the dispatch order
+    calls = sorted(read_calls(log), key=lambda call: int(call["cwd"].rsplit("-", 2)[1]))
+    ranks = {call["params"][0]: call["mpi_count"] for call in calls}
+    assert len(ranks) == 11
+    # the expensive task starts first with most of the cores, the cheap ones run next to it on one rank
+    assert calls[0]["params"] == ["a=10"]
+    assert ranks["a=10"] == 3
+    assert sorted(ranks.values()).count(1) >= 5
+    assert all(1 <= count <= 4 for count in ranks.values())
+
+
+def test_adaptive_mpi_needs_g4blmpi(tmp_path, fake_g4bl):
+    cmd, _ = fake_g4bl()
+    automator = Automator().set_cmd(cmd).set_file_name("beam.g4bl").set_params_dict({"a": [1]})
+    with pytest.raises(ValueError):
+        automator.automate(total_process_count=4, adaptive_mpi=True)
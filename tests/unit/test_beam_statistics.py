@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+
+from g4bl_suite.BeamStatistics import BeamStatistics, PhaseSpaceMoments, phase_space
+from g4bl_suite.GlobalVariables import feature_dict, particle_mass
+
+path = os.path.dirname(os.path.realpath(__file__))  # directory path of the app
+SAMPLE = os.path.join(path, "test_data", "detector_sample.txt")
+
+
+def make_beam(rows=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    data = np.zeros((rows, 12))
+    data[:, feature_dict["x"]] = rng.normal(0, 3, rows)
+    data[:, feature_dict["Px"]] = 0.5 * data[:, feature_dict["x"]] + rng.normal(0, 2, rows)
+    data[:, feature_dict["y"]] = rng.normal(1, 2, rows)
+    data[:, feature_dict["Py"]] = rng.normal(0, 1, rows)
+    data[:, feature_dict["Pz"]] = rng.normal(200, 5, rows)
+    data[:, feature_dict["PDGid"]] = rng.choice([13, -211], rows)
+    data[:, feature_dict["Weight"]] = rng.uniform(0.5, 1.5, rows)
+    return data
+
+
+def test_moments_match_numpy():
+    data = make_beam()
+    values = phase_space(data)
+    weights = data[:, feature_dict["Weight"]]
+    moments = PhaseSpaceMoments.from_values(values, weights)
+
+    np.testing.assert_allclose(moments.covariance(), np.cov(values.T, aweights=weights, bias=True))
+    covariance = np.cov(values[:, [0, 1]].T, aweights=weights, bias=True)
+    assert moments.emittance("x") == pytest.approx(np.sqrt(np.linalg.det(covariance)))
+    twiss = moments.twiss("x")
+    assert twiss["beta"] * twiss["gamma"] - twiss["alpha"] ** 2 == pytest.approx(1)
+
+
+def test_merging_blocks_is_exact():
+    data = make_beam()
+    whole = BeamStatistics(data)
+    merged = BeamStatistics()
+    for block in np.array_split(data, 7):
+        merged.merge(BeamStatistics(block))
+
+    for species in (None, "mu-", "pi-"):
+        np.testing.assert_allclose(merged.covariance(species), whole.covariance(species))
+    assert merged.get_moments("mu-").count + merged.get_moments("pi-").count == len(data)
+
+
+def test_from_file_streams_the_same_statistics():
+    streamed = BeamStatistics.from_file(SAMPLE, rows=7)
+    whole = BeamStatistics(np.loadtxt(SAMPLE))
+
+    assert streamed.emittance("mu-", "y") == pytest.approx(whole.emittance("mu-", "y"))
+    assert streamed.normalized_emittance("pi-") == pytest.approx(whole.normalized_emittance("pi-"))
+    summary = streamed.summary().set_index("species")
+    assert summary.loc["all", "count"] == 40
+    assert summary.loc["pi-", "count"] == 20
+    assert np.isnan(summary.loc["all", "normalized_emittance_x"])
+
+
+def test_normalized_emittance_uses_the_mass():
+    data = make_beam()
+    statistics = BeamStatistics(data)
+    moments = statistics.get_moments("mu-")
+    covariance = moments.covariance()
+    expected = np.sqrt(covariance[0, 0] * covariance[4, 4] - covariance[0, 4] ** 2) / particle_mass[13]
+    assert statistics.normalized_emittance("mu-") == pytest.approx(expected)
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+
+from g4bl_suite import DataAnalyzer
+from g4bl_suite.DataAnalyzer import CompactData, load_columns
+
+path = os.path.dirname(os.path.realpath(__file__))  # directory path of the app
+
+sample_file = os.path.join(path, "test_data/detector_sample.txt")
+
+
+def test_load_columns_dtypes_and_values():
+    full = DataAnalyzer(sample_file).get_data()
+    data = load_columns(sample_file, ["Pz", "PDGid", "Px"], float_dtype=np.float32)
+
+    assert list(data.columns) == ["Px", "Pz", "PDGid"]
+    assert data.columns["PDGid"].dtype == np.int32
+    assert data.columns["Px"].dtype == np.float32
+    assert data.shape == (40, 3)
+    assert np.array_equal(DataAnalyzer.get_feature(data, "PDGid"), DataAnalyzer.get_feature(full, "PDGid"))
+    assert np.allclose(DataAnalyzer.get_x_angle(data), DataAnalyzer.get_x_angle(full), rtol=1e-6)
+
+
+def test_compact_data_works_with_static_methods():
+    full = DataAnalyzer(sample_file).get_data()
+    data = DataAnalyzer(sample_file, compact=True).get_data()
+
+    assert isinstance(data, CompactData)
+    assert data.nbytes < full.nbytes
+    for particle_name in ["pi-", "mu-", "mu+"]:
+        assert DataAnalyzer.get_particle_count(data, particle_name) == DataAnalyzer.get_particle_count(
+            full, particle_name
+        )
+        assert np.array_equal(
+            DataAnalyzer.extract_particle_data(data, particle_name).to_array(),
+            DataAnalyzer.extract_particle_data(full, particle_name),
+        )
+    assert DataAnalyzer.particle_exists(data, particle_id=11)
+
+
+def test_compact_data_from_cache(tmp_path):
+    data = DataAnalyzer(sample_file, cache=True, cache_dir=str(tmp_path), columns=["x", "PDGid"]).get_data()
+
+    assert data.shape == (40, 2)
+    assert data.columns["PDGid"].dtype == np.int32
+
+    array = data.to_array()
+    full = DataAnalyzer(sample_file).get_data()
+    assert array.shape == (40, 12)
+    assert np.array_equal(array[:, [0, 7]], full[:, [0, 7]])
+    assert np.isnan(array[:, 1]).all()
+
+
+def test_compact_data_missing_column():
+    data = load_columns(sample_file, ["x"])
+
+    try:
+        DataAnalyzer.get_feature(data, "y")
+    except KeyError as e:
+        assert "y" in str(e)
+    else:
+        assert False, "reading a column that was not loaded should raise a KeyError"
+
+
+def test_load_columns_reads_ids_written_as_floats(tmp_path):
+    full = DataAnalyzer(sample_file).get_data()
+    file_name = tmp_path / "floats.txt"
+    np.savetxt(file_name, full, header="x y z Px Py Pz t PDGid EventID TrackID ParentID Weight")
+
+    data = load_columns(str(file_name), ["PDGid", "EventID"])
+    assert data.columns["PDGid"].dtype == np.int32
+    assert np.array_equal(data.columns["PDGid"], full[:, 7])
+
+    file_name.write_text("#header\n1 2 3 4 5 6 7 13.5 1 1 0 1\n")
+    with pytest.raises(ValueError):
+        load_columns(str(file_name), ["PDGid"])
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pytest
+
+from g4bl_suite import Column, DataAnalyzer, Selection
+from g4bl_suite.Cuts import species
+from g4bl_suite.DataAnalyzer import load_columns
+from g4bl_suite.GlobalVariables import feature_dict, particle_mass
+
+path = os.path.dirname(os.path.realpath(__file__))
+
+sample_file = os.path.join(path, "test_data/detector_sample.txt")
+
+
+def make_data(rows=100_000):
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(rows, 12))
+    data[:, feature_dict["Pz"]] = rng.normal(200, 5, rows)
+    data[:, feature_dict["PDGid"]] = rng.choice([13, -13, -211], rows)
+    return data
+
+
+def test_cuts_match_hand_written_masks():
+    data = make_data()
+    cut = (Column("x") ** 2 + Column("y") ** 2 < 1.5**2) & (abs(Column("x_angle")) < 5)
+    expected = (data[:, 0] ** 2 + data[:, 1] ** 2 < 1.5**2) & (np.abs(DataAnalyzer.get_x_angle(data)) < 5)
+
+    np.testing.assert_array_equal(cut.mask(data, block_rows=1000), expected)
+    np.testing.assert_array_equal(cut.apply(data), data[expected])
+    assert ((Column("radius") < 1.5) & (abs(Column("x_angle")) < 5)).count(data) == expected.sum()
+
+    either = species("mu-") | ~(Column("momentum") > 200)
+    momentum = np.sqrt(np.sum(data[:, 3:6] ** 2, axis=1))
+    np.testing.assert_array_equal(either.mask(data), (data[:, 7] == 13) | ~(momentum > 200))
+
+
+def test_selection_caches_derived_columns():
+    data = make_data()
+    selection = Selection(data, block_rows=4096)
+    pions = selection.select(species("pi-") & Column("kinetic_energy").between(50, 100))
+    assert set(selection.derived_cache) == {"kinetic_energy", "momentum"}
+
+    momentum = np.sqrt(np.sum(data[:, 3:6] ** 2, axis=1))
+    mass = particle_mass[-211]
+    kinetic_energy = np.sqrt(momentum**2 + mass**2) - mass
+    expected = (data[:, 7] == -211) & (kinetic_energy >= 50) & (kinetic_energy < 100)
+    np.testing.assert_array_equal(pions, data[expected])
+
+    cached = selection.derived_cache["kinetic_energy"]
+    selection.count(Column("kinetic_energy") > 60)
+    assert selection.derived_cache["kinetic_energy"] is cached
+
+
+def test_uncached_selection_matches_the_cached_one():
+    data = make_data()
+    cut = species("mu-") & (Column("kinetic_energy") > 100) & (abs(Column("y_angle")) < 5)
+    uncached = Selection(data, block_rows=4096, cache_derived=False)
+
+    np.testing.assert_array_equal(uncached.mask(cut), Selection(data, block_rows=4096).mask(cut))
+    assert uncached.derived_cache == {}
+
+
+def test_cuts_on_files_and_compact_data():
+    cut = species("pi-") & (Column("radius") >= 0)
+    full = DataAnalyzer(sample_file).get_data()
+
+    np.testing.assert_array_equal(cut.apply_file(sample_file, rows=7), cut.apply(full))
+    compact = load_columns(sample_file, ["x", "y", "PDGid"])
+    assert cut.count(compact) == 20
+
+    with pytest.raises(KeyError):
+        Column("energy")
@@ -0,0 +1,35 @@
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+
+from g4bl_suite.DataAnalyzer import density_grid, scatter_plot  # noqa: E402
+
+
+def test_density_grid_matches_histogram2d():
+    rng = np.random.default_rng(0)
+    x = rng.normal(0, 1, 100_000)
+    y = 0.5 * x + rng.normal(0, 1, x.size)
+    weights = rng.uniform(0, 1, x.size)
+
+    grid, x_edges, y_edges = density_grid(x, y, bins=(40, 30), weights=weights)
+    expected, expected_x, expected_y = np.histogram2d(x, y, bins=(40, 30), weights=weights)
+    np.testing.assert_allclose(grid, expected)
+    np.testing.assert_allclose(x_edges, expected_x)
+    np.testing.assert_allclose(y_edges, expected_y)
+
+
+def test_density_grid_drops_points_out_of_range():
+    grid, _, _ = density_grid([0.5, 5.0, np.nan], [0.5, 0.5, 0.5], bins=2, plot_range=((0, 1), (0, 1)))
+    assert grid.sum() == 1
+
+
+def test_scatter_plot_density_draws_one_image():
+    x = np.random.default_rng(1).normal(0, 1, 10_000)
+    fig, axes = plt.subplots()
+    scatter_plot(axes, x, x**2, density=True, bins=64, log_scale=True)
+    assert len(axes.images) == 1
+    assert not axes.collections
+    assert axes.images[0].get_array().shape == (64, 64)
+    plt.close(fig)
@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+from conftest import read_calls
+
+from g4bl_suite import Automator
+from g4bl_suite.Automator import KEPT_DIRECTORY_PREFIX, concatenate_detector_files, split_event_ranges
+
+
+def test_split_event_ranges_cover_every_event():
+    ranges = split_event_ranges(1001, 7)
+    assert ranges[0][0] == 1 and ranges[-1][1] == 1001
+    assert all(last + 1 == first for (_, last), (first, _) in zip(ranges, ranges[1:]))
+
+
+def test_concatenate_detector_files_keeps_one_header(tmp_path):
+    first = tmp_path / "first.txt"
+    second = tmp_path / "second.txt"
+    first.write_text("#header\n#columns\n1 2\n3 4")
+    second.write_text("#header\n#columns\n5 6\n")
+    output = tmp_path / "all.txt"
+    concatenate_detector_files([str(first), str(second)], str(output))
+    assert output.read_text() == "#header\n#columns\n1 2\n3 4\n5 6\n"
+
+
+def test_automate_splits_events(tmp_path, fake_g4bl, monkeypatch):
+    cmd, log = fake_g4bl(detectors=("detector1", "detector2"))
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    work = tmp_path / "work"
+    work.mkdir()
+    monkeypatch.chdir(work)
+
+    automator = Automator().set_cmd(cmd).set_file_name("../beam.g4bl").set_params_dict({"a": [1], "nEv": [10]})
+    automator.automate(total_process_count=3, event_splits=3)
+
+    calls = read_calls(log)
+    assert sorted(call["params"][2:] for call in calls) == [
+        ["first=1", "last=3"],
+        ["first=4", "last=6"],
+        ["first=7", "last=10"],
+    ]
+    assert len({call["cwd"] for call in calls}) == 3
+    # the sub-job directories are gone, only the concatenated files are left
+    assert sorted(os.listdir(work)) == ["a1|nEv10|detector1.txt", "a1|nEv10|detector2.txt"]
+    data = np.loadtxt(work / "a1|nEv10|detector1.txt")
+    assert data[:, 8].tolist() == list(range(1, 11))
+
+
+def test_automate_keeps_the_other_files_of_split_tasks(tmp_path, fake_g4bl, monkeypatch):
+    cmd, _ = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    monkeypatch.chdir(tmp_path)
+
+    automator = (
+        Automator().set_cmd(cmd).set_file_name(str(script)).set_params_dict({"nEv": [10], "extra": ["histo.root"]})
+    )
+    automator.automate(total_process_count=2, event_splits=2)
+
+    kept = sorted(name for name in os.listdir(tmp_path) if name.startswith(KEPT_DIRECTORY_PREFIX))
+    assert len(kept) == 2
+    assert all(os.path.isfile(tmp_path / name / "histo.root") for name in kept)
+    # the detector files were concatenated, not kept twice
+    assert not [name for name in os.listdir(tmp_path / kept[0]) if name.endswith(".txt")]
+    assert np.loadtxt(tmp_path / "nEv10|extrahisto.root|detector1.txt")[:, 8].tolist() == list(range(1, 11))
@@ -1,5 +1,8 @@
+from multiprocessing.pool import ThreadPool
+
 from g4bl_suite import Automator
 from g4bl_suite import DataAnalyzer
+from g4bl_suite.Automator import imap_unordered_bounded
 
 g4bl_cmd = "g4bl"
 g4blmpi_cmd = "g4blmpi"
@@ -149,3 +152,31 @@ def test_singular_tuple():
         ]
     ]
     assert generated_args == test_args
+
+
+def test_iter_args_is_lazy():
+    # 10 parameters of 10 values would never fit in memory as a list
+    param_dict = {f"p{i}": list(range(10)) for i in range(10)}
+    automator = Automator().set_params_dict(param_dict).set_cmd(g4bl_cmd).set_file_name(file_name)
+
+    args = automator.iter_args()
+
+    assert next(args) == [g4bl_cmd, file_name] + [f"p{i}=0" for i in range(10)]
+    assert next(args)[-1] == "p9=1"
+    assert automator.count_args() == 10**10
+    assert automator.automate(count_only=True) == 10**10
+
+
+def test_imap_unordered_bounded_pulls_tasks_lazily():
+    pulled = []
+
+    def tasks():
+        for i in range(1000):
+            pulled.append(i)
+            yield i
+
+    with ThreadPool(2) as pool:
+        results = imap_unordered_bounded(pool, lambda x: x * 2, tasks(), window=4)
+        first = next(results)
+        assert len(pulled) <= 5
+        assert sorted([first] + list(results)) == [2 * i for i in range(1000)]
@@ -1 +1,48 @@
-# empty for now
\ No newline at end of file
+import os
+
+import numpy as np
+
+from g4bl_suite import DataAnalyzer
+from g4bl_suite.DataAnalyzer import ParticleGroups
+
+path = os.path.dirname(os.path.realpath(__file__))  # directory path of the app
+
+sample_file = os.path.join(path, "test_data/detector_sample.txt")
+
+
+def test_get_particle_count():
+    data = DataAnalyzer(sample_file).get_data()
+
+    assert DataAnalyzer.get_particle_count(data, "pi-") == 20
+    assert DataAnalyzer.get_particle_count(data, "mu-") == 12
+    assert DataAnalyzer.get_particle_count(data, "mu+") == 4
+    assert DataAnalyzer.get_particle_count(data, particle_id=11) == 4
+
+
+def test_get_particle_counts_in_one_pass():
+    data = DataAnalyzer(sample_file).get_data()
+
+    assert DataAnalyzer.get_particle_counts(data) == {"pi-": 20, "mu-": 12, "mu+": 4}
+    assert DataAnalyzer.get_particle_counts(data, by_name=False) == {-211: 20, -13: 4, 11: 4, 13: 12}
+
+
+def test_particle_groups_extract():
+    analyzer = DataAnalyzer(sample_file)
+    data = analyzer.get_data()
+    groups = analyzer.get_particle_groups()
+
+    assert analyzer.get_particle_groups() is groups
+    for particle_name in ["pi-", "mu-", "mu+"]:
+        assert np.array_equal(groups.extract(particle_name), DataAnalyzer.extract_particle_data(data, particle_name))
+    assert groups.extract(particle_id=2212).shape == (0, 12)
+    assert groups.get_count(particle_id=2212) == 0
+
+
+def test_particle_groups_with_nuclei():
+    data = np.zeros((4, 12))
+    data[:, 7] = [1000020040, 13, 1000020040, -211]
+
+    groups = ParticleGroups(data)
+
+    assert groups.get_counts(by_name=False) == {-211: 1, 13: 1, 1000020040: 2}
+    assert np.array_equal(groups.get_rows(particle_id=1000020040), [0, 2])
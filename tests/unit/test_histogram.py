@@ -0,0 +1,125 @@
+import os
+import warnings
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+from g4bl_suite.DataAnalyzer import Histogram, hist_plot  # noqa: E402
+
+path = os.path.dirname(os.path.realpath(__file__))
+
+SAMPLE = os.path.join(path, "test_data/detector_sample.txt")
+
+
+def test_histogram_matches_numpy():
+    values = np.random.default_rng(0).normal(0, 1, 100_000)
+    weights = np.random.default_rng(1).uniform(0, 2, values.size)
+    histogram = Histogram(-3, 3, 60).fill(values, weights)
+
+    counts, _ = np.histogram(values, bins=60, range=(-3, 3))
+    np.testing.assert_array_equal(histogram.counts, counts)
+    assert histogram.underflow + histogram.counts.sum() + histogram.overflow == values.size
+    assert histogram.mean == pytest.approx(np.average(values, weights=weights))
+    assert histogram.std == pytest.approx(np.sqrt(np.cov(values, aweights=weights, bias=True)))
+    width = 6 / 60
+    assert abs(histogram.quantile(0.75) - np.percentile(values, 75)) < width
+
+
+def test_histograms_merge_exactly():
+    values = np.random.default_rng(2).exponential(1, 10_000)
+    whole = Histogram(0, 5, 50).fill(values)
+    merged = Histogram(0, 5, 50)
+    for block in np.array_split(values, 9):
+        merged.merge(Histogram(0, 5, 50).fill(block))
+
+    np.testing.assert_array_equal(merged.counts, whole.counts)
+    assert merged.summary() == pytest.approx(whole.summary())
+    with pytest.raises(ValueError):
+        merged.merge(Histogram(0, 5, 10))
+
+
+def test_huge_values_land_in_the_flows():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        histogram = Histogram(0, 2, 2).fill([1e25, 1e100, -1e100, 0.5])
+    assert (histogram.underflow, histogram.overflow) == (1, 2)
+    assert histogram.counts.tolist() == [1, 0]
+
+    # their variance overflows, but they are still binned in the flows
+    with np.errstate(over="ignore"):
+        histogram = Histogram(0, 2, 2).fill([1e300, -1e300, 1.5])
+    assert (histogram.underflow, histogram.overflow) == (1, 1)
+    assert histogram.counts.tolist() == [0, 1]
+
+
+def test_weighted_histogram_statistics_agree():
+    histogram = Histogram(0, 2, 2).fill([0.5, 1.5], [0, 10])
+
+    summary = histogram.summary()
+    assert summary["mean"] == pytest.approx(1.5)
+    assert summary["50%"] >= 1.0 and summary["25%"] >= 1.0
+    assert histogram.weighted_counts.tolist() == [0, 10]
+
+    fig, axes = plt.subplots()
+    hist_plot(axes, histogram, "x")
+    assert [patch.get_height() for patch in axes.patches] == [0, 10]
+    plt.close("all")
+
+    # the weights outside the range count in the quantiles too, and survive a save
+    outside = Histogram(0, 2, 2).fill([-1.0, 0.5, 1.5], [10, 1, 1])
+    assert outside.quantile(0.5) == pytest.approx(-1.0)
+    restored = Histogram.from_arrays(outside.to_arrays())
+    assert restored.weighted_underflow == 10
+    np.testing.assert_allclose(restored.quantile([0.25, 0.5, 0.95]), outside.quantile([0.25, 0.5, 0.95]))
+
+
+def test_histogram_from_file_is_cached(tmp_path):
+    cache_file = str(tmp_path / "x.npz")
+    first = Histogram.from_file(SAMPLE, "EventID", 0, 50, 10, rows=7, cache_file=cache_file)
+    assert first.counts.sum() == 40
+
+    loaded = Histogram.from_file(SAMPLE, "EventID", 0, 50, 10, cache_file=cache_file)
+    np.testing.assert_array_equal(loaded.counts, first.counts)
+    assert loaded.summary() == pytest.approx(first.summary())
+
+    # other bins make a new histogram
+    other = Histogram.from_file(SAMPLE, "EventID", 0, 50, 5, cache_file=cache_file)
+    assert other.bins == 5
+
+
+def test_histogram_cache_tells_functions_apart(tmp_path):
+    cache_file = str(tmp_path / "f.npz")
+    event = Histogram.from_file(SAMPLE, lambda data: data[:, 8], 0, 50, 10, cache_file=cache_file)
+    # another lambda, with the same name, computes something else
+    shifted = Histogram.from_file(SAMPLE, lambda data: data[:, 8] + 20, 0, 50, 10, cache_file=cache_file)
+    assert shifted.counts.tolist() != event.counts.tolist()
+
+    def offset_by(offset):
+        return lambda data: data[:, 8] + offset
+
+    assert Histogram.from_file(SAMPLE, offset_by(20), 0, 50, 10, cache_file=cache_file).counts.tolist() == (
+        shifted.counts.tolist()
+    )
+    assert Histogram.from_file(SAMPLE, offset_by(0), 0, 50, 10, cache_file=cache_file).counts.tolist() == (
+        event.counts.tolist()
+    )
+
+    with pytest.raises(ValueError):
+        Histogram.from_file(SAMPLE, np.abs, 0, 50, 10, cache_file=cache_file)
+
+
+def test_hist_plot_renders_a_histogram():
+    fig, axes = plt.subplots()
+    histogram = Histogram(0, 10, 10).fill(np.arange(10.0))
+    hist_plot(axes, histogram, "x")
+    assert sum(patch.get_height() for patch in axes.patches) == 10
+    assert "Count: 10" in axes.texts[0].get_text()
+
+    fig, axes = plt.subplots()
+    hist_plot(axes, np.arange(9.0), "x")
+    assert "50%: 4.0" in axes.texts[0].get_text()
+    plt.close("all")
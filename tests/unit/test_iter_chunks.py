@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+
+from g4bl_suite import DataAnalyzer
+
+path = os.path.dirname(os.path.realpath(__file__))  # directory path of the app
+
+sample_file = os.path.join(path, "test_data/detector_sample.txt")
+
+
+def test_iter_chunks_covers_the_file():
+    chunks = list(DataAnalyzer.iter_chunks(sample_file, rows=7))
+
+    assert [chunk.shape[0] for chunk in chunks] == [7, 7, 7, 7, 7, 5]
+    assert np.array_equal(np.concatenate(chunks), DataAnalyzer(sample_file).get_data())
+
+
+def test_chunked_counts_and_extraction():
+    data = DataAnalyzer(sample_file).get_data()
+
+    for particle_name in ["pi-", "mu-", "mu+"]:
+        assert DataAnalyzer.get_particle_count_chunked(
+            sample_file, particle_name, rows=6
+        ) == DataAnalyzer.get_particle_count(data, particle_name)
+        assert np.array_equal(
+            DataAnalyzer.extract_particle_data_chunked(sample_file, particle_name, rows=6),
+            DataAnalyzer.extract_particle_data(data, particle_name),
+        )
+
+
+def test_chunked_angle_stats():
+    data = DataAnalyzer.extract_particle_data(DataAnalyzer(sample_file).get_data(), "pi-")
+    x_angle = DataAnalyzer.get_x_angle(data)
+
+    stats = DataAnalyzer.get_angle_stats_chunked(sample_file, "pi-", rows=4)
+
+    assert stats["x_angle"]["count"] == x_angle.size
+    assert np.isclose(stats["x_angle"]["mean"], x_angle.mean())
+    assert np.isclose(stats["x_angle"]["std"], x_angle.std())
+    assert stats["x_angle"]["min"] == x_angle.min()
+    assert stats["x_angle"]["max"] == x_angle.max()
+    assert np.isclose(stats["y_angle"]["std"], DataAnalyzer.get_y_angle(data).std())
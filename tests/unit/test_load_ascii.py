@@ -0,0 +1,98 @@
+import importlib
+import os
+
+import numpy as np
+import pytest
+
+from g4bl_suite import DataAnalyzer
+from g4bl_suite.DataAnalyzer import load_ascii, load_cached
+
+# the package exports the DataAnalyzer class under the name of its module
+data_analyzer_module = importlib.import_module("g4bl_suite.DataAnalyzer")
+
+path = os.path.dirname(os.path.realpath(__file__))  # directory path of the app
+
+sample_file = os.path.join(path, "test_data/detector_sample.txt")
+
+
+def test_load_ascii_matches_genfromtxt():
+    data = load_ascii(sample_file)
+
+    assert data.shape == (40, 12)
+    assert np.array_equal(data, np.genfromtxt(sample_file))
+
+
+def test_load_ascii_without_trailing_newline(tmp_path):
+    file_name = tmp_path / "no_newline.txt"
+    with open(sample_file) as f:
+        file_name.write_text(f.read().rstrip("\n"))
+
+    assert np.array_equal(load_ascii(str(file_name)), np.genfromtxt(sample_file))
+
+
+def test_load_ascii_single_row(tmp_path):
+    file_name = tmp_path / "single_row.txt"
+    file_name.write_text("#x y z\n1 2 3 4 5 6 7 13 1 1 0 1\n")
+
+    data = load_ascii(str(file_name))
+    assert data.shape == (1, 12)
+    assert DataAnalyzer(str(file_name)).get_data().shape == (1, 12)
+
+
+def test_load_ascii_header_only(tmp_path):
+    file_name = tmp_path / "header_only.txt"
+    file_name.write_text("#BLTrackFile2\n#x y z Px Py Pz t PDGid EventID TrackID ParentID Weight\n")
+
+    assert load_ascii(str(file_name)).shape == (0, 12)
+
+
+def test_data_analyzer_uses_genfromtxt_kwargs():
+    data = DataAnalyzer(sample_file, usecols=(0, 1)).get_data()
+
+    assert data.shape == (40, 2)
+
+
+def test_load_cached_writes_and_reuses_cache(tmp_path, monkeypatch):
+    data = load_cached(sample_file, cache_dir=str(tmp_path))
+
+    assert isinstance(data, np.memmap)
+    assert np.array_equal(data, np.genfromtxt(sample_file))
+
+    # the second load must come from the cache, not from the text file
+    def fail(*args, **kwargs):
+        raise AssertionError("the detector file was parsed again")
+
+    monkeypatch.setattr(data_analyzer_module, "load_ascii", fail)
+    assert np.array_equal(load_cached(sample_file, cache_dir=str(tmp_path)), data)
+
+
+def test_load_cached_invalidates_on_rerun(tmp_path):
+    file_name = tmp_path / "detector.txt"
+    file_name.write_text("#x y z\n1 2 3 4 5 6 7 13 1 1 0 1\n")
+    assert load_cached(str(file_name)).shape == (1, 12)
+    assert os.path.exists(str(file_name) + ".cache.npy")
+
+    file_name.write_text("#x y z\n1 2 3 4 5 6 7 13 1 1 0 1\n1 2 3 4 5 6 7 -13 2 1 0 1\n")
+    stat = os.stat(file_name)
+    os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    data = DataAnalyzer(str(file_name), cache=True).get_data()
+    assert data.shape == (2, 12)
+    assert data[1, 7] == -13
+
+
+def test_load_cached_falls_back_when_the_cache_can_not_be_written(tmp_path):
+    # a file where the cache directory should be: nothing can be written there
+    blocked = tmp_path / "blocked"
+    blocked.write_text("")
+
+    with pytest.warns(UserWarning, match="Could not write the cache"):
+        data = load_cached(sample_file, cache_dir=str(blocked / "cache"))
+    assert np.array_equal(data, np.genfromtxt(sample_file))
+
+
+def test_data_analyzer_rejects_genfromtxt_kwargs_with_cache():
+    with pytest.raises(ValueError):
+        DataAnalyzer(sample_file, cache=True, usecols=(0, 1))
+    with pytest.raises(ValueError):
+        DataAnalyzer(sample_file, compact=True, usecols=(0, 1))
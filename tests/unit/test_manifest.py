@@ -0,0 +1,171 @@
+import os
+import socket
+
+from conftest import read_calls
+
+from g4bl_suite import Automator, RunManifest
+from g4bl_suite.Automator import JOURNAL_FILE, WORK_DIRECTORY_PREFIX, RunReport, TaskResult
+
+
+def test_manifest_skips_completed_tasks(tmp_path, fake_g4bl, monkeypatch):
+    cmd, log = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    manifest_file = str(tmp_path / "manifest.sqlite")
+    monkeypatch.chdir(tmp_path)
+
+    automator = (
+        Automator().set_cmd(cmd).set_file_name(str(script)).set_params_dict({"a": [1, 2], "exit": [0, 3]})
+    )
+    automator.automate(total_process_count=2, manifest_file=manifest_file, detector_lst=["detector1"])
+    assert len(read_calls(log)) == 4
+
+    with RunManifest(manifest_file) as manifest:
+        digest = RunManifest.hash_file(str(script))
+        ok = RunManifest.task_key([cmd, str(script), "a=1", "exit=0"], digest)
+        failed = RunManifest.task_key([cmd, str(script), "a=1", "exit=3"], digest)
+        assert manifest.status(ok) == RunManifest.DONE
+        assert manifest.status(failed) == RunManifest.FAILED
+        assert manifest.outputs(ok) == [os.path.join(os.getcwd(), "a1|exit0|detector1.txt")]
+        assert os.path.exists(tmp_path / "a1|exit0|detector1.txt")
+
+    # only the failed tasks run again
+    automator.automate(total_process_count=2, manifest_file=manifest_file, detector_lst=["detector1"])
+    assert sorted(call["params"][0] for call in read_calls(log)[4:]) == ["a=1", "a=2"]
+
+    # a new script invalidates every task
+    script.write_text("param -unset a=1\n")
+    automator.automate(total_process_count=2, manifest_file=manifest_file, detector_lst=["detector1"])
+    assert len(read_calls(log)) == 10
+
+
+def test_manifest_runs_tasks_whose_outputs_are_gone(tmp_path, fake_g4bl, monkeypatch):
+    cmd, log = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    manifest_file = str(tmp_path / "manifest.sqlite")
+    monkeypatch.chdir(tmp_path)
+
+    automator = Automator().set_cmd(cmd).set_file_name(str(script)).set_params_dict({"a": [1, 2]})
+    automator.automate(total_process_count=2, manifest_file=manifest_file, detector_lst=["detector1"])
+    assert automator.automate(manifest_file=manifest_file, detector_lst=["detector1"], count_only=True) == 0
+
+    # a deleted detector file is not trusted to the manifest
+    os.remove(tmp_path / "a2|detector1.txt")
+    automator.automate(total_process_count=2, manifest_file=manifest_file, detector_lst=["detector1"])
+    assert [call["params"] for call in read_calls(log)[2:]] == [["a=2"]]
+    assert os.path.exists(tmp_path / "a2|detector1.txt")
+
+
+def test_automate_writes_run_log(tmp_path, fake_g4bl, monkeypatch, capsys):
+    cmd, log = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    run_log = str(tmp_path / "runs.jsonl")
+    monkeypatch.chdir(tmp_path)
+
+    automator = Automator().set_cmd(cmd).set_file_name(str(script)).set_params_dict({"a": [1], "exit": [0, 2]})
+    automator.automate(total_process_count=2, run_log=run_log)
+
+    runs = RunReport.load(run_log).sort_values("returncode")
+    assert runs["returncode"].tolist() == [0, 2]
+    assert (runs["wall_time"] > 0).all()
+    assert (runs["max_rss_kb"] > 0).all()
+    assert runs["stderr_tail"].tolist() == ["", "G4Exception: fake failure"]
+
+    output = capsys.readouterr().out
+    assert "Tasks run = 2, failed = 1" in output
+    assert "Failed with exit code 2: a=1 exit=2" in output
+
+
+def test_run_report_keeps_the_last_failures():
+    report = RunReport()
+    for i in range(RunReport.FAILURES_COUNT + 5):
+        report.add(TaskResult(["g4bl", "beam.g4bl", f"a={i}"], 1, 1.0))
+
+    assert report.failed == RunReport.FAILURES_COUNT + 5
+    assert len(report.failures) == RunReport.FAILURES_COUNT
+    assert report.failures[-1].args[-1] == f"a={RunReport.FAILURES_COUNT + 4}"
+    summary = str(report)
+    assert f"failed = {RunReport.FAILURES_COUNT + 5}" in summary
+    assert "a=0" not in summary
+
+
+def test_automate_commits_outputs_atomically(tmp_path, fake_g4bl, monkeypatch):
+    cmd, log = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    monkeypatch.chdir(tmp_path)
+    # left by a run of this host that was killed: a dead process id and a half written detector file
+    stale = tmp_path / f"{WORK_DIRECTORY_PREFIX}{socket.gethostname()}-999999999-0-0"
+    stale.mkdir()
+    (stale / "a1|exit0|detector1.txt").write_text("#BLTrackFile2 fake\n1 2")
+    # the process ids of another host sharing the directory mean nothing here
+    other_host = tmp_path / f"{WORK_DIRECTORY_PREFIX}other-host.cluster-999999999-0-0"
+    other_host.mkdir()
+
+    automator = Automator().set_cmd(cmd).set_file_name(str(script)).set_params_dict({"a": [1], "exit": [0, 3]})
+    automator.automate(total_process_count=2, resume=True)
+
+    names = sorted(os.listdir(tmp_path))
+    assert "a1|exit0|detector1.txt" in names
+    # the failed task leaves nothing behind, and no work directory of this host is left
+    assert "a1|exit3|detector1.txt" not in names
+    assert [name for name in names if name.startswith(WORK_DIRECTORY_PREFIX)] == [other_host.name]
+
+    # resuming only runs the task that did not finish
+    automator.automate(total_process_count=2, resume=True)
+    assert [call["params"] for call in read_calls(log)[2:]] == [["a=1", "exit=3"]]
+
+
+def test_automate_resumes_with_a_relative_command(tmp_path, fake_g4bl, monkeypatch):
+    fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    monkeypatch.chdir(tmp_path)
+
+    automator = Automator().set_cmd(os.path.join("bin", "g4bl")).set_file_name("beam.g4bl")
+    automator.set_params_dict({"a": [1, 2]})
+    automator.automate(total_process_count=2, resume=True)
+    assert len(read_calls(tmp_path / "g4bl_calls.jsonl")) == 2
+
+    # the journal keys of the first run match the tasks of the second one
+    assert automator.automate(count_only=True, resume=True) == 0
+    automator.automate(total_process_count=2, resume=True)
+    assert len(read_calls(tmp_path / "g4bl_calls.jsonl")) == 2
+
+
+def test_automate_does_not_journal_by_default(tmp_path, fake_g4bl, monkeypatch):
+    cmd, log = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    monkeypatch.chdir(tmp_path)
+
+    automator = Automator().set_cmd(cmd).set_file_name(str(script)).set_params_dict({"a": [1]})
+    automator.automate()
+    automator.automate()
+    assert len(read_calls(log)) == 2
+    assert JOURNAL_FILE not in os.listdir(tmp_path)
+
+
+def test_automate_keeps_script_paths_and_every_output(tmp_path, fake_g4bl, monkeypatch):
+    cmd, log = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    (tmp_path / "fieldmap.dat").write_text("map\n")
+    monkeypatch.chdir(tmp_path)
+
+    automator = (
+        Automator()
+        .set_cmd(cmd)
+        .set_file_name(str(script))
+        .set_params_dict({"input": ["fieldmap.dat"], "extra": ["histo.root"]})
+    )
+    automator.automate(run_log=str(tmp_path / "runs.jsonl"))
+
+    # the relative input resolved from the current directory, and the histogram file was not thrown away
+    assert RunReport.load(str(tmp_path / "runs.jsonl"))["returncode"].tolist() == [0]
+    assert (tmp_path / "inputfieldmap.dat|extrahisto.root|detector1.txt").exists()
+    assert (tmp_path / "histo.root").read_text() == "histograms\n"
+    assert (tmp_path / "fieldmap.dat").read_text() == "map\n"
+    assert not [name for name in os.listdir(tmp_path) if os.path.islink(tmp_path / name)]
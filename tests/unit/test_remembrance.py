@@ -170,13 +170,13 @@ def test_get_index_of_needed_tasks():
 
     result_list = []
 
-    # First 3 element is True, middle 5 element is False, last element is True
+    # The files of the first 3 tasks and of the last one exist, only the middle 5 tasks are needed
     for _ in range(3):
-        result_list.append(True)
-    for _ in range(5):
         result_list.append(False)
-    for _ in range(1):
+    for _ in range(5):
         result_list.append(True)
+    for _ in range(1):
+        result_list.append(False)
 
     assert True
     assert (
@@ -204,12 +204,40 @@ def test_skip_task_by_list():
     ]
 
     result_list = [
-        ["g4bl", "file_name", "_meanMomentum=100", "angle=1"],
-        ["g4bl", "file_name", "_meanMomentum=100", "angle=2"],
-        ["g4bl", "file_name", "_meanMomentum=100", "angle=3"],
-        ["g4bl", "file_name", "_meanMomentum=300", "angle=3"],
+        ["g4bl", "file_name", "_meanMomentum=200", "angle=1"],
+        ["g4bl", "file_name", "_meanMomentum=200", "angle=2"],
+        ["g4bl", "file_name", "_meanMomentum=200", "angle=3"],
+        ["g4bl", "file_name", "_meanMomentum=300", "angle=1"],
+        ["g4bl", "file_name", "_meanMomentum=300", "angle=2"],
     ]
     assert (
         automator.skip_task_by_list(generated_args, postfix_string_list, None, True)
         == result_list
     )
+
+
+def test_list_data_directory():
+    automator = Automator()
+    existing_files = automator.list_data_directory(test=True)
+
+    assert "_meanMomentum100|angle1|detector1.txt" in existing_files
+    assert "_meanMomentum200|angle1|detector2.txt" not in existing_files
+    assert automator.list_data_directory(data_directory=os.path.join(path, "no_such_directory")) == set()
+
+    assert automator.all_file_exists(
+        ["_meanMomentum300|angle3|detector1.txt"], existing_files=existing_files
+    ) is True
+
+
+def test_get_index_of_needed_tasks_summarizes_missing_files(capsys):
+    automator = Automator()
+    data_list_of_list = automator.construct_list_files(
+        filtered_arg_list=[["_meanMomentum=200", "angle=1"], ["_meanMomentum=200", "angle=2"]],
+        postfix_string_list=["detector1", "detector2"],
+    )
+
+    automator.get_index_of_needed_tasks(data_list=data_list_of_list, test=True)
+
+    output = capsys.readouterr().out.strip().splitlines()
+    assert len(output) == 1
+    assert output[0].startswith("3 of 4 files not found")
@@ -0,0 +1,192 @@
+import importlib
+import os
+import re
+import shutil
+from multiprocessing.pool import ThreadPool
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from g4bl_suite import DataAnalyzer, ScanAnalyzer
+from g4bl_suite.ScanAnalyzer import summarize_file
+
+# the package exports the ScanAnalyzer class under the name of its module
+scan_analyzer_module = importlib.import_module("g4bl_suite.ScanAnalyzer")
+
+path = os.path.dirname(os.path.realpath(__file__))  # directory path of the app
+
+sample_file = os.path.join(path, "test_data/detector_sample.txt")
+
+param_dict = {"_meanMomentum": [100, 200], "angle": [1, 2, 3]}
+detector_lst = ["detector1", "detector2"]
+
+
+def make_scan(data_directory, skip=()):
+    """Copies the sample detector file under every file name of the scan"""
+    for momentum in param_dict["_meanMomentum"]:
+        for angle in param_dict["angle"]:
+            for detector in detector_lst:
+                file_name = f"_meanMomentum{momentum}|angle{angle}|{detector}.txt"
+                if file_name not in skip:
+                    shutil.copy(sample_file, os.path.join(data_directory, file_name))
+
+
+def test_get_file_index(tmp_path):
+    scan = ScanAnalyzer().set_params_dict(param_dict).set_data_directory(str(tmp_path)).set_detector_lst(detector_lst)
+
+    index = scan.get_file_index()
+
+    assert len(index) == 12
+    assert index[("200", "3", "detector2")] == os.path.join(str(tmp_path), "_meanMomentum200|angle3|detector2.txt")
+
+
+def test_load_all(tmp_path):
+    make_scan(str(tmp_path), skip=["_meanMomentum200|angle1|detector1.txt"])
+    scan = ScanAnalyzer().set_params_dict(param_dict).set_data_directory(str(tmp_path)).set_detector_lst(detector_lst)
+    expected = DataAnalyzer(sample_file).get_data()
+
+    for use_threads in [False, True]:
+        analyzers = scan.load_all(process_count=2, use_threads=use_threads)
+
+        assert len(analyzers) == 11
+        assert ("200", "1", "detector1") not in analyzers
+        assert np.array_equal(analyzers[("100", "2", "detector1")].get_data(), expected)
+
+
+def test_summarize_file():
+    data = DataAnalyzer(sample_file).get_data()
+
+    summary = summarize_file(sample_file, rows=9)
+
+    assert summary["tracks"] == 40
+    assert summary["mu-_count"] == DataAnalyzer.get_particle_count(data, "mu-")
+    assert np.isclose(summary["x_angle_mean"], DataAnalyzer.get_x_angle(data).mean())
+    assert np.isclose(summary["y_angle_std"], DataAnalyzer.get_y_angle(data).std())
+    assert np.isclose(summary["momentum_mean"], np.linalg.norm(data[:, 3:6], axis=1).mean())
+
+
+def test_summarize_and_save(tmp_path):
+    data_directory = tmp_path / "data"
+    data_directory.mkdir()
+    make_scan(str(data_directory))
+    scan = (
+        ScanAnalyzer().set_params_dict(param_dict).set_data_directory(str(data_directory)).set_detector_lst(detector_lst)
+    )
+
+    frame = scan.summarize(process_count=2)
+
+    assert len(frame) == 12
+    assert list(frame.columns[:4]) == ["_meanMomentum", "angle", "detector", "file_name"]
+    assert frame["_meanMomentum"].tolist() == [100] * 6 + [200] * 6
+    assert (frame["tracks"] == 40).all()
+
+    file_name = str(tmp_path / "summary.npz")
+    ScanAnalyzer.save_summary(frame, file_name)
+    loaded = ScanAnalyzer.load_summary(file_name)
+    assert loaded["detector"].tolist() == frame["detector"].tolist()
+    assert np.allclose(loaded["x_angle_mean"], frame["x_angle_mean"])
+
+
+def test_incremental_summary(tmp_path, monkeypatch):
+    data_directory = tmp_path / "data"
+    data_directory.mkdir()
+    make_scan(str(data_directory), skip=["_meanMomentum200|angle3|detector2.txt"])
+    scan = (
+        ScanAnalyzer().set_params_dict(param_dict).set_data_directory(str(data_directory)).set_detector_lst(detector_lst)
+    )
+    store_file = str(tmp_path / "summary.npz")
+
+    first = scan.summarize(process_count=1, store_file=store_file)
+    assert len(first) == 11
+
+    # a new file and a rerun file are the only ones read again
+    shutil.copy(sample_file, str(data_directory / "_meanMomentum200|angle3|detector2.txt"))
+    rerun = str(data_directory / "_meanMomentum100|angle1|detector1.txt")
+    with open(rerun, "a") as f:
+        f.write("0 0 5921 0 0 100 20 13 99 2 1 1\n")
+
+    summarized = []
+    real_summarize_entry = scan_analyzer_module._summarize_entry
+    monkeypatch.setattr(scan_analyzer_module.mp, "Pool", ThreadPool)
+    monkeypatch.setattr(
+        scan_analyzer_module,
+        "_summarize_entry",
+        lambda entry: summarized.append(os.path.basename(entry[1])) or real_summarize_entry(entry),
+    )
+
+    second = scan.summarize(process_count=1, store_file=store_file)
+
+    assert sorted(summarized) == ["_meanMomentum100|angle1|detector1.txt", "_meanMomentum200|angle3|detector2.txt"]
+    assert len(second) == 12
+    assert second["tracks"].tolist() == [41] + [40] * 11
+    assert np.allclose(second["x_angle_std"].iloc[1:], first["x_angle_std"].iloc[1])
+
+
+def test_summary_store_survives_an_interrupted_save(tmp_path, monkeypatch):
+    data_directory = tmp_path / "data"
+    data_directory.mkdir()
+    make_scan(str(data_directory))
+    scan = (
+        ScanAnalyzer().set_params_dict(param_dict).set_data_directory(str(data_directory)).set_detector_lst(detector_lst)
+    )
+    store_file = str(tmp_path / "summary.npz")
+    first = scan.summarize(process_count=1, store_file=store_file)
+
+    def interrupted(f, **columns):
+        f.write(b"PK half written")
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch:
+        patch.setattr(scan_analyzer_module.np, "savez", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            ScanAnalyzer.save_summary(first, store_file)
+    assert sorted(os.listdir(tmp_path)) == ["data", "summary.npz"]
+    assert ScanAnalyzer.load_summary(store_file)["tracks"].tolist() == first["tracks"].tolist()
+
+    # a store that is corrupt anyway is rebuilt rather than failing
+    with open(store_file, "wb") as f:
+        f.write(b"PK half written")
+    with pytest.warns(UserWarning):
+        assert scan.summarize(process_count=1, store_file=store_file)["tracks"].tolist() == first["tracks"].tolist()
+
+
+def test_render_figures_skips_unchanged_inputs(tmp_path, capsys):
+    data_directory = tmp_path / "data"
+    data_directory.mkdir()
+    make_scan(str(data_directory))
+    figures_directory = str(tmp_path / "figures")
+    scan = (
+        ScanAnalyzer()
+        .set_params_dict(param_dict)
+        .set_data_directory(str(data_directory))
+        .set_detector_lst(detector_lst)
+    )
+    panels = [
+        {"kind": "density", "x": "x", "y": "x_angle", "bins": 16},
+        {"kind": "hist", "x": "Pz", "species": "mu-", "bins": 8},
+    ]
+
+    figures = scan.render_figures(panels, figures_directory, process_count=2, file_format="png", size=(4, 3), dpi=50)
+    assert len(figures) == 12
+    assert all(os.path.exists(figure) for figure in figures.values())
+    assert "Rendered 12 figures" in capsys.readouterr().out
+
+    with open(data_directory / "_meanMomentum100|angle1|detector1.txt", "a") as f:
+        f.write("1 2 3 4 5 6 7 13 99 1 0 1\n")
+    pdf_file = str(tmp_path / "scan.pdf")
+    # the backend of the caller, e.g. an interactive session, is left alone
+    backend = matplotlib.get_backend()
+    plt.switch_backend("svg")
+    try:
+        scan.render_figures(
+            panels, figures_directory, process_count=2, file_format="png", size=(4, 3), dpi=50, pdf_file=pdf_file
+        )
+        assert matplotlib.get_backend() == "svg"
+        assert plt.get_fignums() == []
+    finally:
+        plt.switch_backend(backend)
+    assert "Rendered 1 figures, 11 were up to date" in capsys.readouterr().out
+    with open(pdf_file, "rb") as f:
+        assert len(re.findall(rb"/Type /Page[^s]", f.read())) == 12
@@ -0,0 +1,66 @@
+import pytest
+from conftest import read_calls
+
+from g4bl_suite import Automator, RunManifest
+from g4bl_suite.Scheduler import desired_ranks, estimate_costs, longest_first, projected_makespan
+
+
+def test_estimate_costs_from_history():
+    tasks = [["g4bl", "f", "nEv=1"], ["g4bl", "f", "nEv=2"], ["g4bl", "f", "nEv=3"]]
+    history = {("nEv=1",): 10.0, ("nEv=3",): 30.0}
+
+    assert estimate_costs(tasks, history=history, key_fn=RunManifest.task_params) == [10.0, 20.0, 30.0]
+    assert estimate_costs(tasks) == [1.0, 1.0, 1.0]
+    with pytest.raises(ValueError):
+        estimate_costs(tasks, history=history)
+
+
+def test_desired_ranks_favour_expensive_tasks_on_a_mixed_grid():
+    costs = [1] * 100 + [100] * 10
+    ranks = desired_ranks(costs, 16)
+    assert set(ranks[:100]) == {1}
+    assert min(ranks[100:]) > 1
+    # with the ranks they get, the expensive tasks fit in the balanced load of a core
+    assert max(cost / rank for cost, rank in zip(costs, ranks)) <= sum(costs) / 16
+
+    ranks = desired_ranks([1] * 60 + [20] * 4 + [5] * 8, 32)
+    assert ranks[:60] == [1] * 60
+    assert ranks[60:64] == [4] * 4
+    assert ranks[64:] == [1] * 8
+
+
+def test_longest_first_shortens_the_tail():
+    costs = [1, 1, 1, 1, 1, 1, 6]
+
+    assert projected_makespan(costs, 2) == 9
+    assert projected_makespan([costs[i] for i in longest_first(costs)], 2) == 6
+
+
+def test_automate_dispatches_longest_first(tmp_path, fake_g4bl, monkeypatch, capsys):
+    cmd, log = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset nEv=1\n")
+    monkeypatch.chdir(tmp_path)
+
+    automator = Automator().set_cmd(cmd).set_file_name(str(script)).set_params_dict({"nEv": [1, 5, 3, 2]})
+    automator.automate(total_process_count=1, cost_fn=lambda args: int(args[-1].split("=")[1]))
+
+    assert [call["params"] for call in read_calls(log)] == [["nEv=5"], ["nEv=3"], ["nEv=2"], ["nEv=1"]]
+    assert "Projected makespan = 11.0 cost units, actual makespan = " in capsys.readouterr().out
+
+
+def test_automate_uses_recorded_runtimes(tmp_path, fake_g4bl, monkeypatch):
+    cmd, log = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset sleep=0\n")
+    manifest_file = str(tmp_path / "manifest.sqlite")
+    monkeypatch.chdir(tmp_path)
+
+    automator = Automator().set_cmd(cmd).set_file_name(str(script)).set_params_dict({"sleep": [0, 0.3]})
+    automator.automate(total_process_count=1, manifest_file=manifest_file)
+    assert [call["params"] for call in read_calls(log)] == [["sleep=0"], ["sleep=0.3"]]
+
+    # editing the script reruns every task, the slow one first thanks to the recorded runtimes
+    script.write_text("param -unset sleep=1\n")
+    automator.automate(total_process_count=1, manifest_file=manifest_file, longest_first_order=True)
+    assert [call["params"] for call in read_calls(log)[2:]] == [["sleep=0.3"], ["sleep=0"]]
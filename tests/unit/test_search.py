@@ -0,0 +1,118 @@
+import os
+
+from conftest import read_calls
+
+from g4bl_suite import Automator
+
+
+def test_search_finds_the_optimum_with_few_runs(tmp_path, fake_g4bl, monkeypatch):
+    cmd, log = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0 b=0\n")
+    monkeypatch.chdir(tmp_path)
+
+    def objective(analyzers):
+        # the fake g4bl writes x = a and y = b for every track
+        data = analyzers["detector1"].data
+        return -((data[0, 0] - 3.0) ** 2) - (data[0, 1] + 2.0) ** 2
+
+    frame = (
+        Automator()
+        .set_cmd(cmd)
+        .set_file_name(str(script))
+        .search(
+            {"a": (-10.0, 10.0), "b": (-10.0, 10.0)},
+            objective,
+            fixed_params={"nEv": 2},
+            batch_size=8,
+            rounds=5,
+            seed=1,
+            detector_lst=["detector1"],
+            total_process_count=4,
+        )
+    )
+
+    assert len(frame) == 40
+    assert len(read_calls(log)) <= 40
+    assert frame["objective"].is_monotonic_decreasing
+    best = frame.iloc[0]
+    assert abs(best["a"] - 3.0) < 1.5 and abs(best["b"] + 2.0) < 1.5
+    # later rounds search a smaller box around the optimum
+    last = frame[frame["round"] == 4]
+    assert last["a"].max() - last["a"].min() < 5
+
+
+def test_search_keeps_integer_ranges(tmp_path, fake_g4bl, monkeypatch):
+    cmd, log = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    monkeypatch.chdir(tmp_path)
+
+    frame = (
+        Automator()
+        .set_cmd(cmd)
+        .set_file_name(str(script))
+        .search(
+            {"a": (1, 5)},
+            lambda analyzers: analyzers["detector1"].data[0, 0],
+            batch_size=4,
+            rounds=1,
+            seed=0,
+            detector_lst=["detector1"],
+        )
+    )
+    assert set(frame["a"]) <= {1, 2, 3, 4, 5}
+    assert (frame["objective"] == frame["a"]).all()
+    assert all(call["params"][0] in {f"a={i}" for i in range(1, 6)} for call in read_calls(log))
+
+
+def test_search_reads_the_output_directory(tmp_path, fake_g4bl, monkeypatch):
+    cmd, _ = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    monkeypatch.chdir(tmp_path)
+
+    frame = (
+        Automator()
+        .set_cmd(cmd)
+        .set_file_name(str(script))
+        .search(
+            {"a": (1, 5)},
+            lambda analyzers: analyzers["detector1"].data[0, 0],
+            batch_size=4,
+            rounds=1,
+            seed=0,
+            detector_lst=["detector1"],
+            output_directory=str(tmp_path / "scan"),
+        )
+    )
+
+    assert frame["objective"].notna().all()
+    assert len(os.listdir(tmp_path / "scan")) == frame["a"].nunique()
+
+
+def test_search_runs_every_point_once(tmp_path, fake_g4bl, monkeypatch):
+    cmd, log = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    monkeypatch.chdir(tmp_path)
+
+    # 3 integer values for 8 points a round, 3 rounds
+    frame = (
+        Automator()
+        .set_cmd(cmd)
+        .set_file_name(str(script))
+        .search(
+            {"a": (1, 3)},
+            lambda analyzers: analyzers["detector1"].data[0, 0],
+            batch_size=8,
+            rounds=3,
+            seed=0,
+            detector_lst=["detector1"],
+        )
+    )
+
+    params = [call["params"][0] for call in read_calls(log)]
+    assert len(params) == len(set(params)) <= 3
+    assert len(frame) == len(params)
+    assert frame.iloc[0]["a"] == 3
@@ -0,0 +1,64 @@
+import numpy as np
+from conftest import read_calls
+
+from g4bl_suite import Automator
+
+
+def test_successive_halving_refines_the_best(tmp_path, fake_g4bl, monkeypatch):
+    cmd, log = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    monkeypatch.chdir(tmp_path)
+
+    automator = Automator().set_cmd(cmd).set_file_name(str(script)).set_params_dict({"a": list(range(9))})
+    frame = automator.successive_halving(
+        lambda analyzers: -abs(analyzers["detector1"].data[0, 0] - 5),
+        max_events=27,
+        min_events=3,
+        detector_lst=["detector1"],
+        total_process_count=3,
+    )
+
+    assert frame.groupby("rung").size().tolist() == [9, 3, 1]
+    assert frame.iloc[0]["configuration"] == "a=5"
+    assert frame.iloc[0]["nEv"] == 27
+
+    calls = read_calls(log)
+    ranges = sorted(tuple(call["params"][2:]) for call in calls)
+    assert ranges.count(()) == 9
+    assert ranges.count(("first=4", "last=9")) == 3
+    assert ranges.count(("first=10", "last=27")) == 1
+    # 9 * 3 + 3 * 6 + 18 events simulated, where the whole grid at full statistics is 9 * 27
+    data = np.loadtxt(tmp_path / "a5|nEv27|detector1.txt")
+    assert data[:, 8].tolist() == list(range(1, 28))
+
+    # everything is on disk, a second call simulates nothing
+    automator.successive_halving(
+        lambda analyzers: -abs(analyzers["detector1"].data[0, 0] - 5),
+        max_events=27,
+        min_events=3,
+        detector_lst=["detector1"],
+    )
+    assert len(read_calls(log)) == len(calls)
+
+
+def test_successive_halving_reads_the_output_directory(tmp_path, fake_g4bl, monkeypatch):
+    cmd, log = fake_g4bl()
+    script = tmp_path / "beam.g4bl"
+    script.write_text("param -unset a=0\n")
+    output = tmp_path / "scan"
+    monkeypatch.chdir(tmp_path)
+
+    automator = Automator().set_cmd(cmd).set_file_name(str(script)).set_params_dict({"a": list(range(3))})
+    frame = automator.successive_halving(
+        lambda analyzers: analyzers["detector1"].data[0, 0],
+        max_events=9,
+        min_events=3,
+        detector_lst=["detector1"],
+        output_directory=str(output),
+    )
+
+    assert frame["objective"].notna().all()
+    assert frame.iloc[0]["configuration"] == "a=2"
+    assert (output / "a2|nEv9|detector1.txt").exists()
+    assert not (tmp_path / "a2|nEv9|detector1.txt").exists()
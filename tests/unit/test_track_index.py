@@ -0,0 +1,56 @@
+import numpy as np
+
+from g4bl_suite import TrackIndex
+from g4bl_suite.GlobalVariables import feature_dict
+from g4bl_suite.TrackIndex import track_keys
+
+
+def make_tracks(event_ids, track_ids, parent_ids, pdg=13):
+    data = np.zeros((len(event_ids), 12))
+    data[:, feature_dict["EventID"]] = event_ids
+    data[:, feature_dict["TrackID"]] = track_ids
+    data[:, feature_dict["ParentID"]] = parent_ids
+    data[:, feature_dict["PDGid"]] = pdg
+    return data
+
+
+def test_find_matches_brute_force():
+    rng = np.random.default_rng(0)
+    events = rng.integers(1, 500, 5000)
+    tracks = rng.integers(1, 50, 5000)
+    index = TrackIndex(make_tracks(events, tracks, np.zeros(5000)))
+
+    first_rows = {}
+    for row, key in enumerate(zip(events, tracks)):
+        first_rows.setdefault(key, row)
+    # few queries are searched as they come, many are sorted first
+    for count in (200, 50_000):
+        queries_events = rng.integers(1, 500, count)
+        queries_tracks = rng.integers(1, 50, count)
+        rows = index.find_tracks(queries_events, queries_tracks)
+        expected = [first_rows.get(key, -1) for key in zip(queries_events, queries_tracks)]
+        assert rows.tolist() == expected
+
+
+def test_parents_across_detectors():
+    # pi- at the target, their decay mu- downstream
+    target = make_tracks([1, 1, 2], [1, 4, 1], [0, 0, 0], pdg=-211)
+    downstream = make_tracks([1, 2, 3], [2, 5, 2], [1, 1, 1])
+    target_index = TrackIndex(target)
+    downstream_index = TrackIndex(downstream)
+
+    assert downstream_index.parents(other=target_index).tolist() == [0, 2, -1]
+    assert downstream_index.parents().tolist() == [-1, -1, -1]
+
+
+def test_ancestors_and_join():
+    first = make_tracks([1, 1, 1, 1, 2], [1, 2, 3, 4, 1], [0, 1, 2, 3, 0])
+    index = TrackIndex(first)
+    assert index.ancestors([3, 4]).tolist() == [[2, 1, 0], [-1, -1, -1]]
+    assert index.ancestors([3], max_depth=1).tolist() == [[2]]
+
+    second = make_tracks([2, 1, 7], [1, 3, 1], [0, 2, 0])
+    rows, other_rows = index.join(TrackIndex(second))
+    assert rows.tolist() == [2, 4]
+    assert other_rows.tolist() == [1, 0]
+    assert index.contains(track_keys([1, 9], [4, 4])).tolist() == [True, False]
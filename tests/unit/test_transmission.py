@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from g4bl_suite import Transmission
+from g4bl_suite.GlobalVariables import feature_dict
+
+
+def write_detector(file_name, events, z):
+    data = np.zeros((len(events), 12))
+    data[:, feature_dict["x"]] = events
+    data[:, feature_dict["z"]] = z
+    data[:, feature_dict["Pz"]] = 100
+    data[:, feature_dict["PDGid"]] = [13 if event % 2 else -211 for event in events]
+    data[:, feature_dict["EventID"]] = events
+    data[:, feature_dict["TrackID"]] = 1
+    data[:, feature_dict["Weight"]] = 1
+    np.savetxt(file_name, data, header="BLTrackFile2 fake\nx y z Px Py Pz t PDGid EventID TrackID ParentID Weight")
+
+
+@pytest.fixture
+def transmission(tmp_path):
+    files = []
+    for i, (events, z) in enumerate([(range(1, 11), 0), (range(1, 8), 100), (list(range(1, 5)) + [9], 200)]):
+        files.append(str(tmp_path / f"det{i}.txt"))
+        write_detector(files[-1], list(events), z)
+    return Transmission(files, names=["target", "middle", "end"], rows=3)
+
+
+def test_transmission_fractions(transmission):
+    table = transmission.transmission()
+    assert table["count"].tolist() == [10, 7, 5]
+    # event 9 skipped the middle detector, it does not count as transmitted
+    assert table["reach"].tolist() == [10, 7, 4]
+    assert table["transmission"].tolist() == pytest.approx([1, 0.7, 0.4])
+    assert table["step_transmission"].tolist() == pytest.approx([1, 0.7, 4 / 7])
+
+    mu = transmission.transmission("mu-")
+    assert mu["reach"].tolist() == [5, 4, 2]
+
+
+def test_losses(transmission):
+    losses = transmission.losses()
+    assert losses["lost_after"].tolist() == [3, 3, 4]
+    histogram = transmission.loss_histogram(bins=2)
+    assert histogram.counts.tolist() == [3, 3]
+    assert transmission.z.tolist() == [0, 100, 200]
+
+
+def test_conditional_subsets(transmission):
+    survivors = transmission.subset(0, reaching=2)
+    assert survivors[:, feature_dict["EventID"]].tolist() == [1, 2, 3, 4]
+    lost = transmission.subset(0, lost_before=1, species="pi-")
+    assert lost[:, feature_dict["EventID"]].tolist() == [8, 10]